@@ -0,0 +1,103 @@
+"""adding running review counters to courses and professors
+
+Revision ID: 3f9c2a7d41b8
+Revises: a1b2c3d4e5f6
+Create Date: 2026-10-18 09:12:44.104219
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2a7d41b8'
+down_revision: Union[str, None] = 'a1b2c3d4e5f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for column in ['review_count', 'rating_sum', 'difficulty_sum', 'workload_sum']:
+        op.add_column(
+            'course',
+            sa.Column(column, sa.BigInteger(), nullable=False, server_default='0')
+        )
+    for column in ['rating_sum', 'difficulty_sum', 'workload_sum']:
+        op.add_column(
+            'professor',
+            sa.Column(column, sa.BigInteger(), nullable=False, server_default='0')
+        )
+
+    # backfill the counters once, everything after this is incremental
+    op.execute(sa.text(
+        """
+        UPDATE course c
+        SET
+            review_count = s.review_count,
+            rating_sum = s.rating_sum,
+            difficulty_sum = s.difficulty_sum,
+            workload_sum = s.workload_sum,
+            avg_rating = ROUND(s.rating_sum::numeric / s.review_count, 2),
+            avg_workload = ROUND(s.workload_sum::numeric / s.review_count)
+        FROM (
+            SELECT
+                course_id,
+                COUNT(*) AS review_count,
+                SUM(overall_rating) AS rating_sum,
+                SUM(difficulty) AS difficulty_sum,
+                SUM(workload_rating) AS workload_sum
+            FROM review
+            GROUP BY course_id
+        ) s
+        WHERE c.id = s.course_id
+        """
+    ))
+    op.execute(sa.text(
+        """
+        UPDATE professor p
+        SET
+            total_reviews = COALESCE(s.review_count, 0),
+            rating_sum = COALESCE(s.rating_sum, 0),
+            difficulty_sum = COALESCE(s.difficulty_sum, 0),
+            workload_sum = COALESCE(s.workload_sum, 0),
+            avg_rating = COALESCE(ROUND(s.rating_sum::numeric / NULLIF(s.review_count, 0), 2), 0),
+            avg_difficulty = COALESCE(s.difficulty_sum::numeric / NULLIF(s.review_count, 0), 0),
+            avg_workload = COALESCE(s.workload_sum::numeric / NULLIF(s.review_count, 0), 0)
+        FROM professor p2
+        LEFT JOIN (
+            SELECT
+                pc.professor_id,
+                SUM(c.review_count) AS review_count,
+                SUM(c.rating_sum) AS rating_sum,
+                SUM(c.difficulty_sum) AS difficulty_sum,
+                SUM(c.workload_sum) AS workload_sum
+            FROM professors_courses pc
+            JOIN course c ON c.id = pc.course_id
+            GROUP BY pc.professor_id
+        ) s ON s.professor_id = p2.id
+        WHERE p.id = p2.id
+        """
+    ))
+    op.alter_column(
+        'professor',
+        'total_reviews',
+        nullable=False,
+        server_default='0'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column(
+        'professor',
+        'total_reviews',
+        nullable=True,
+        server_default=None
+    )
+    for column in ['rating_sum', 'difficulty_sum', 'workload_sum']:
+        op.drop_column('professor', column)
+    for column in ['review_count', 'rating_sum', 'difficulty_sum', 'workload_sum']:
+        op.drop_column('course', column)
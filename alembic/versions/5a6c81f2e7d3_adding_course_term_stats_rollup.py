@@ -0,0 +1,65 @@
+"""adding course term stats rollup
+
+Revision ID: 5a6c81f2e7d3
+Revises: e2d47b9a10c6
+Create Date: 2026-10-18 15:02:38.219755
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a6c81f2e7d3'
+down_revision: Union[str, None] = 'e2d47b9a10c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'course_term_stats',
+        sa.Column('course_id', sa.Integer(), sa.ForeignKey('course.id'), nullable=False),
+        sa.Column('term', sa.String(), nullable=False),
+        # null for reviews we cannot attribute to a professor
+        sa.Column('professor_id', sa.Integer(), sa.ForeignKey('professor.id'), nullable=True),
+        sa.Column('review_count', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('rating_sum', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('difficulty_sum', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('workload_sum', sa.BigInteger(), nullable=False, server_default='0')
+    )
+    # NULLS NOT DISTINCT so unattributed rows can be upserted too (postgres 15+)
+    op.execute(sa.text(
+        """
+        ALTER TABLE course_term_stats
+        ADD CONSTRAINT uq_course_term_stats
+        UNIQUE NULLS NOT DISTINCT (course_id, term, professor_id)
+        """
+    ))
+
+    # reviews do not record their professor yet, so history is unattributed
+    op.execute(sa.text(
+        """
+        INSERT INTO course_term_stats
+            (course_id, term, professor_id, review_count,
+             rating_sum, difficulty_sum, workload_sum)
+        SELECT
+            course_id,
+            term,
+            NULL,
+            COUNT(*),
+            SUM(overall_rating),
+            SUM(difficulty),
+            SUM(workload_rating)
+        FROM review
+        GROUP BY course_id, term
+        """
+    ))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('course_term_stats')
@@ -0,0 +1,55 @@
+"""adding indexes for course lookups on review and professors_courses
+
+Revision ID: 7b1e5d08c3a2
+Revises: 3f9c2a7d41b8
+Create Date: 2026-10-18 10:03:17.562901
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b1e5d08c3a2'
+down_revision: Union[str, None] = '3f9c2a7d41b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # built concurrently so review inserts keep going while the index builds
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_review_course_id',
+            'review',
+            ['course_id'],
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+        op.create_index(
+            'ix_professors_courses_course_id',
+            'professors_courses',
+            ['course_id'],
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_professors_courses_course_id',
+            'professors_courses',
+            postgresql_concurrently=True,
+            if_exists=True
+        )
+        op.drop_index(
+            'ix_review_course_id',
+            'review',
+            postgresql_concurrently=True,
+            if_exists=True
+        )
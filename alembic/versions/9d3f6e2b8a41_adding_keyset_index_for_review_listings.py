@@ -0,0 +1,56 @@
+"""adding keyset index for review listings
+
+Revision ID: 9d3f6e2b8a41
+Revises: 5a6c81f2e7d3
+Create Date: 2026-10-18 16:21:09.402377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d3f6e2b8a41'
+down_revision: Union[str, None] = '5a6c81f2e7d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # (course_id, id) serves "reviews of a course, newest first, after id X"
+    # straight from the index and still covers plain course_id lookups
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_review_course_id_id',
+            'review',
+            ['course_id', 'id'],
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+        op.drop_index(
+            'ix_review_course_id',
+            'review',
+            postgresql_concurrently=True,
+            if_exists=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_review_course_id',
+            'review',
+            ['course_id'],
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+        op.drop_index(
+            'ix_review_course_id_id',
+            'review',
+            postgresql_concurrently=True,
+            if_exists=True
+        )
@@ -0,0 +1,93 @@
+"""adding full text search to review comments
+
+Revision ID: b4e8a2c6f913
+Revises: 9d3f6e2b8a41
+Create Date: 2026-10-18 17:05:44.630158
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4e8a2c6f913'
+down_revision: Union[str, None] = '9d3f6e2b8a41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# reviews updated per transaction while backfilling
+BACKFILL_BATCH_SIZE = 50000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # nullable without a default is a catalog-only change, a generated column
+    # would rewrite the whole table under an exclusive lock
+    op.add_column('review', sa.Column('comments_tsv', postgresql.TSVECTOR(), nullable=True))
+
+    # a trigger rather than application code, so every insert path (including
+    # the COPY bulk load) keeps it current
+    op.execute(sa.text(
+        """
+        CREATE FUNCTION review_comments_tsv() RETURNS trigger AS $$
+        BEGIN
+            NEW.comments_tsv := to_tsvector('english', coalesce(NEW.comments, ''));
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    ))
+    op.execute(sa.text(
+        """
+        CREATE TRIGGER review_comments_tsv
+        BEFORE INSERT OR UPDATE OF comments ON review
+        FOR EACH ROW EXECUTE FUNCTION review_comments_tsv()
+        """
+    ))
+
+    with op.get_context().autocommit_block():
+        # reviews written from here on go through the trigger, the ones
+        # before it are filled in short transactions
+        connection = op.get_bind()
+        bounds = connection.execute(
+            sa.text("SELECT MIN(id) AS low, MAX(id) AS high FROM review")
+        ).first()
+        if bounds.low is not None:
+            for low in range(bounds.low, bounds.high + 1, BACKFILL_BATCH_SIZE):
+                connection.execute(
+                    sa.text(
+                        """
+                        UPDATE review
+                        SET comments_tsv = to_tsvector('english', coalesce(comments, ''))
+                        WHERE id BETWEEN :low AND :high
+                        AND comments_tsv IS NULL
+                        """
+                    ),
+                    {"low": low, "high": low + BACKFILL_BATCH_SIZE - 1}
+                )
+
+        op.create_index(
+            'ix_review_comments_tsv',
+            'review',
+            ['comments_tsv'],
+            postgresql_using='gin',
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_review_comments_tsv',
+            'review',
+            postgresql_concurrently=True,
+            if_exists=True
+        )
+    op.execute(sa.text("DROP TRIGGER IF EXISTS review_comments_tsv ON review"))
+    op.execute(sa.text("DROP FUNCTION IF EXISTS review_comments_tsv()"))
+    op.drop_column('review', 'comments_tsv')
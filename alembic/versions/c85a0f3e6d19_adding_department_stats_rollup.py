@@ -0,0 +1,112 @@
+"""adding department stats rollup
+
+Revision ID: c85a0f3e6d19
+Revises: 7b1e5d08c3a2
+Create Date: 2026-10-18 11:26:51.338470
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c85a0f3e6d19'
+down_revision: Union[str, None] = '7b1e5d08c3a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'department_stats',
+        sa.Column('department_id', sa.Integer(), sa.ForeignKey('department.id'), primary_key=True),
+        sa.Column('total_courses', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_professors', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_reviews', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('rating_sum', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('difficulty_sum', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('workload_sum', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('top_tags', postgresql.ARRAY(sa.String()), nullable=False, server_default='{}')
+    )
+
+    op.create_table(
+        'department_tag_counts',
+        sa.Column('department_id', sa.Integer(), sa.ForeignKey('department.id'), primary_key=True),
+        sa.Column('tag_id', sa.Integer(), sa.ForeignKey('tag.id'), primary_key=True),
+        sa.Column('tag_count', sa.BigInteger(), nullable=False, server_default='0')
+    )
+    op.create_index(
+        'ix_department_tag_counts_top',
+        'department_tag_counts',
+        ['department_id', sa.text('tag_count DESC')]
+    )
+
+    # backfill from the course counters and the existing review tags
+    op.execute(sa.text(
+        """
+        INSERT INTO department_stats
+            (department_id, total_courses, total_professors, total_reviews,
+             rating_sum, difficulty_sum, workload_sum)
+        SELECT
+            d.id,
+            COALESCE(cs.total_courses, 0),
+            COALESCE(ps.total_professors, 0),
+            COALESCE(cs.total_reviews, 0),
+            COALESCE(cs.rating_sum, 0),
+            COALESCE(cs.difficulty_sum, 0),
+            COALESCE(cs.workload_sum, 0)
+        FROM department d
+        LEFT JOIN (
+            SELECT
+                dc.department_id,
+                COUNT(*) AS total_courses,
+                SUM(c.review_count) AS total_reviews,
+                SUM(c.rating_sum) AS rating_sum,
+                SUM(c.difficulty_sum) AS difficulty_sum,
+                SUM(c.workload_sum) AS workload_sum
+            FROM department_courses dc
+            JOIN course c ON c.id = dc.course_id
+            GROUP BY dc.department_id
+        ) cs ON cs.department_id = d.id
+        LEFT JOIN (
+            SELECT dc.department_id, COUNT(DISTINCT pc.professor_id) AS total_professors
+            FROM department_courses dc
+            JOIN professors_courses pc ON pc.course_id = dc.course_id
+            GROUP BY dc.department_id
+        ) ps ON ps.department_id = d.id
+        """
+    ))
+    op.execute(sa.text(
+        """
+        INSERT INTO department_tag_counts (department_id, tag_id, tag_count)
+        SELECT dc.department_id, rt.tag_id, COUNT(*)
+        FROM department_courses dc
+        JOIN review r ON r.course_id = dc.course_id
+        JOIN review_tags rt ON rt.review_id = r.id
+        GROUP BY dc.department_id, rt.tag_id
+        """
+    ))
+    op.execute(sa.text(
+        """
+        UPDATE department_stats ds
+        SET top_tags = ARRAY(
+            SELECT t.name
+            FROM department_tag_counts dtc
+            JOIN tag t ON t.id = dtc.tag_id
+            WHERE dtc.department_id = ds.department_id
+            ORDER BY dtc.tag_count DESC, t.name
+            LIMIT 10
+        )
+        """
+    ))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_department_tag_counts_top', 'department_tag_counts')
+    op.drop_table('department_tag_counts')
+    op.drop_table('department_stats')
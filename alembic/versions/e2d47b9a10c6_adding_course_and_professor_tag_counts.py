@@ -0,0 +1,80 @@
+"""adding course and professor tag count rollups
+
+Revision ID: e2d47b9a10c6
+Revises: c85a0f3e6d19
+Create Date: 2026-10-18 13:40:02.871164
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2d47b9a10c6'
+down_revision: Union[str, None] = 'c85a0f3e6d19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'course_tag_counts',
+        sa.Column('course_id', sa.Integer(), sa.ForeignKey('course.id'), primary_key=True),
+        sa.Column('tag_id', sa.Integer(), sa.ForeignKey('tag.id'), primary_key=True),
+        sa.Column('tag_count', sa.BigInteger(), nullable=False, server_default='0')
+    )
+    op.create_index(
+        'ix_course_tag_counts_top',
+        'course_tag_counts',
+        ['course_id', sa.text('tag_count DESC')]
+    )
+
+    op.create_table(
+        'professor_tag_counts',
+        sa.Column('professor_id', sa.Integer(), sa.ForeignKey('professor.id'), primary_key=True),
+        sa.Column('tag_id', sa.Integer(), sa.ForeignKey('tag.id'), primary_key=True),
+        sa.Column('tag_count', sa.BigInteger(), nullable=False, server_default='0')
+    )
+    op.create_index(
+        'ix_professor_tag_counts_top',
+        'professor_tag_counts',
+        ['professor_id', sa.text('tag_count DESC')]
+    )
+    # professor search goes from tag to professors
+    op.create_index(
+        'ix_professor_tag_counts_tag',
+        'professor_tag_counts',
+        ['tag_id', 'professor_id'],
+        postgresql_include=['tag_count']
+    )
+
+    op.execute(sa.text(
+        """
+        INSERT INTO course_tag_counts (course_id, tag_id, tag_count)
+        SELECT r.course_id, rt.tag_id, COUNT(*)
+        FROM review r
+        JOIN review_tags rt ON rt.review_id = r.id
+        GROUP BY r.course_id, rt.tag_id
+        """
+    ))
+    op.execute(sa.text(
+        """
+        INSERT INTO professor_tag_counts (professor_id, tag_id, tag_count)
+        SELECT pc.professor_id, ctc.tag_id, SUM(ctc.tag_count)
+        FROM professors_courses pc
+        JOIN course_tag_counts ctc ON ctc.course_id = pc.course_id
+        GROUP BY pc.professor_id, ctc.tag_id
+        """
+    ))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_professor_tag_counts_tag', 'professor_tag_counts')
+    op.drop_index('ix_professor_tag_counts_top', 'professor_tag_counts')
+    op.drop_table('professor_tag_counts')
+    op.drop_index('ix_course_tag_counts_top', 'course_tag_counts')
+    op.drop_table('course_tag_counts')
@@ -0,0 +1,152 @@
+"""adding professor_id to reviews
+
+Revision ID: f1a9c3d5b7e2
+Revises: b4e8a2c6f913
+Create Date: 2026-10-18 18:47:30.915442
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1a9c3d5b7e2'
+down_revision: Union[str, None] = 'b4e8a2c6f913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# reviews updated per transaction while backfilling
+BACKFILL_BATCH_SIZE = 50000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # nullable without a default is a catalog-only change, and the foreign key
+    # is validated separately so neither step holds a long exclusive lock
+    op.add_column('review', sa.Column('professor_id', sa.Integer(), nullable=True))
+    op.execute(sa.text(
+        """
+        ALTER TABLE review
+        ADD CONSTRAINT review_professor_id_fkey
+        FOREIGN KEY (professor_id) REFERENCES professor(id)
+        NOT VALID
+        """
+    ))
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_review_professor_id_id',
+            'review',
+            ['professor_id', 'id'],
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+
+        # Old reviews never recorded who taught them. Only reviews of courses
+        # with a single professor can be attributed; the rest stay NULL rather
+        # than being credited to every instructor of the course.
+        connection = op.get_bind()
+        bounds = connection.execute(
+            sa.text("SELECT MIN(id) AS low, MAX(id) AS high FROM review")
+        ).first()
+        if bounds.low is not None:
+            for low in range(bounds.low, bounds.high + 1, BACKFILL_BATCH_SIZE):
+                connection.execute(
+                    sa.text(
+                        """
+                        UPDATE review r
+                        SET professor_id = sp.professor_id
+                        FROM (
+                            SELECT course_id, MIN(professor_id) AS professor_id
+                            FROM professors_courses
+                            GROUP BY course_id
+                            HAVING COUNT(*) = 1
+                        ) sp
+                        WHERE r.course_id = sp.course_id
+                        AND r.id BETWEEN :low AND :high
+                        AND r.professor_id IS NULL
+                        """
+                    ),
+                    {"low": low, "high": low + BACKFILL_BATCH_SIZE - 1}
+                )
+
+        op.execute(sa.text("ALTER TABLE review VALIDATE CONSTRAINT review_professor_id_fkey"))
+
+    op.create_index(
+        'ix_course_term_stats_professor_id',
+        'course_term_stats',
+        ['professor_id']
+    )
+
+    # rebuild the professor-scoped rollups with direct attribution
+    op.execute(sa.text("DELETE FROM course_term_stats"))
+    op.execute(sa.text(
+        """
+        INSERT INTO course_term_stats
+            (course_id, term, professor_id, review_count,
+             rating_sum, difficulty_sum, workload_sum)
+        SELECT
+            course_id,
+            term,
+            professor_id,
+            COUNT(*),
+            SUM(overall_rating),
+            SUM(difficulty),
+            SUM(workload_rating)
+        FROM review
+        GROUP BY course_id, term, professor_id
+        """
+    ))
+    op.execute(sa.text(
+        """
+        UPDATE professor p
+        SET
+            total_reviews = COALESCE(s.review_count, 0),
+            rating_sum = COALESCE(s.rating_sum, 0),
+            difficulty_sum = COALESCE(s.difficulty_sum, 0),
+            workload_sum = COALESCE(s.workload_sum, 0),
+            avg_rating = COALESCE(ROUND(s.rating_sum::numeric / NULLIF(s.review_count, 0), 2), 0),
+            avg_difficulty = COALESCE(s.difficulty_sum::numeric / NULLIF(s.review_count, 0), 0),
+            avg_workload = COALESCE(s.workload_sum::numeric / NULLIF(s.review_count, 0), 0)
+        FROM professor p2
+        LEFT JOIN (
+            SELECT
+                professor_id,
+                SUM(review_count) AS review_count,
+                SUM(rating_sum) AS rating_sum,
+                SUM(difficulty_sum) AS difficulty_sum,
+                SUM(workload_sum) AS workload_sum
+            FROM course_term_stats
+            WHERE professor_id IS NOT NULL
+            GROUP BY professor_id
+        ) s ON s.professor_id = p2.id
+        WHERE p.id = p2.id
+        """
+    ))
+    op.execute(sa.text("DELETE FROM professor_tag_counts"))
+    op.execute(sa.text(
+        """
+        INSERT INTO professor_tag_counts (professor_id, tag_id, tag_count)
+        SELECT r.professor_id, rt.tag_id, COUNT(*)
+        FROM review r
+        JOIN review_tags rt ON rt.review_id = r.id
+        WHERE r.professor_id IS NOT NULL
+        GROUP BY r.professor_id, rt.tag_id
+        """
+    ))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_course_term_stats_professor_id', 'course_term_stats')
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_review_professor_id_id',
+            'review',
+            postgresql_concurrently=True,
+            if_exists=True
+        )
+    op.drop_constraint('review_professor_id_fkey', 'review', type_='foreignkey')
+    op.drop_column('review', 'professor_id')
@@ -0,0 +1,208 @@
+"""
+Per-row cost of building and serializing response models, before and after
+the fast path.
+
+"validated" is how handlers used to work: models built with full validation,
+then FastAPI checks the result against the response model and encodes it with
+jsonable_encoder + json.dumps. "construct" builds the models with
+model_construct instead and encodes them with FastJSONResponse. "trusted" is
+the current path: plain dicts shaped like the models, encoded once by
+FastJSONResponse. The script checks all three produce the same JSON.
+
+No database is needed, rows are synthesized to look like the ones
+get_professor_details and list_courses read.
+
+    uv run python scripts/benchmark_serialization.py --rows 10000
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add the project root to Python path
+root_dir = Path(__file__).parent.parent
+sys.path.append(str(root_dir))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from typing import List
+from src.api.responses import FastJSONResponse
+from src.api.routers.models import Course, Professor, ProfessorDetails, Review
+
+TERMS = ["Fall 2023", "Winter 2024", "Spring 2024", "Fall 2024"]
+TAGS = ["Engaging", "Heavy Reading", "Group Projects", "Tough Grader"]
+
+
+def review_rows(count: int) -> list[SimpleNamespace]:
+    return [
+        SimpleNamespace(
+            review_id=i,
+            course_id=i % 50 + 1,
+            course_code=f"CSC{100 + i % 50}",
+            course_name="Introduction to Computer Science",
+            department="CSC",
+            term=TERMS[i % len(TERMS)],
+            difficulty=i % 5 + 1,
+            overall_rating=(i * 7) % 5 + 1,
+            workload_rating=i % 20,
+            comments="Great course, the projects were long but taught a lot.",
+            tags=TAGS[: i % len(TAGS) + 1],
+        )
+        for i in range(count)
+    ]
+
+
+def course_rows(count: int) -> list[SimpleNamespace]:
+    return [
+        SimpleNamespace(
+            course_id=i // 2,
+            course_code=f"CSC{100 + (i // 2) % 900}",
+            name="Introduction to Computer Science",
+            department="CSC",
+            prof_id=i,
+            prof_name="Ada Lovelace",
+            num_reviews=i % 40,
+        )
+        for i in range(count)
+    ]
+
+
+def builders(path: str):
+    """Constructors for Course, Professor, Review and ProfessorDetails."""
+    if path == "validated":
+        return Course, Professor, Review, ProfessorDetails
+    if path == "construct":
+        return (
+            Course.model_construct,
+            Professor.model_construct,
+            Review.model_construct,
+            ProfessorDetails.model_construct
+        )
+    return dict, dict, dict, dict
+
+
+def professor_details(rows, path: str):
+    course_model, professor_model, review_model, details_model = builders(path)
+
+    reviews = []
+    for row in rows:
+        course = course_model(
+            course_id=row.course_id,
+            course_code=row.course_code,
+            name=row.course_name,
+            department=row.department,
+            professors=[]
+        )
+        reviews.append(review_model(
+            review_id=row.review_id,
+            course=course,
+            term=row.term,
+            difficulty_rating=row.difficulty,
+            overall_rating=row.overall_rating,
+            workload_estimate=row.workload_rating,
+            tags=list(row.tags),
+            comments=row.comments,
+        ))
+
+    professor = professor_model(id="1", name="Ada Lovelace", department="CSC", num_reviews=len(rows), courses=[])
+    return details_model(
+        professor=professor,
+        reviews=reviews,
+        average_difficulty=3.0,
+        average_workload=10.0,
+        average_rating=4.0,
+        most_common_tags=TAGS
+    )
+
+
+def course_list(rows, path: str):
+    course_model, professor_model, _, _ = builders(path)
+
+    courses = {}
+    for row in rows:
+        if row.course_id not in courses:
+            courses[row.course_id] = course_model(
+                course_id=row.course_id,
+                course_code=row.course_code,
+                name=row.name,
+                department=row.department,
+                professors=[]
+            )
+        professors = courses[row.course_id]["professors"] if path == "trusted" else courses[row.course_id].professors
+        professors.append(professor_model(
+            id=str(row.prof_id),
+            name=row.prof_name,
+            department=row.department,
+            num_reviews=row.num_reviews,
+            courses=[]
+        ))
+    return list(courses.values())
+
+
+async def validated_response(content, response_model) -> bytes:
+    field = create_model_field(name="Response", type_=response_model, mode="serialization")
+    encoded = await serialize_response(field=field, response_content=content)
+    return JSONResponse(encoded).body
+
+
+def trusted_response(content) -> bytes:
+    return FastJSONResponse(content).body
+
+
+def measure(function, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    reviews = review_rows(args.rows)
+    courses = course_rows(args.rows)
+    cases = [
+        ("get_professor_details", reviews, professor_details, ProfessorDetails),
+        ("list_courses", courses, course_list, List[Course]),
+    ]
+
+    print(f"{'endpoint':<24}{'path':<11}{'build us/row':>14}{'encode us/row':>15}{'total us/row':>14}")
+    for name, rows, build, response_model in cases:
+        results = {}
+        bodies = {}
+        for path in ("validated", "construct", "trusted"):
+            content = build(rows, path)
+            build_seconds = measure(lambda: build(rows, path), args.repeat)
+            if path == "validated":
+                encode_seconds = measure(
+                    lambda: asyncio.run(validated_response(content, response_model)),
+                    args.repeat
+                )
+                bodies[path] = asyncio.run(validated_response(content, response_model))
+            else:
+                encode_seconds = measure(lambda: trusted_response(content), args.repeat)
+                bodies[path] = trusted_response(content)
+            per_row = [seconds / len(rows) * 1e6 for seconds in (build_seconds, encode_seconds)]
+            results[path] = sum(per_row)
+            print(f"{name:<24}{path:<11}{per_row[0]:>14.2f}{per_row[1]:>15.2f}{sum(per_row):>14.2f}")
+        for path in ("construct", "trusted"):
+            print(f"{name:<24}{'speedup':<11}{path + ' ' + format(results['validated'] / results[path], '.1f') + 'x':>43}")
+
+        expected = json.loads(bodies["validated"])
+        for path in ("construct", "trusted"):
+            if json.loads(bodies[path]) != expected:
+                sys.exit(f"{name}: {path} payload differs from the validated one")
+
+
+if __name__ == "__main__":
+    main()
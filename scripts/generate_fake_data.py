@@ -1,7 +1,50 @@
+"""
+Fill the database with fake schools, departments, courses, professors and
+reviews, then rebuild every rollup the API reads.
+
+The schema comes from the migrations (uv run alembic upgrade head). Columns
+are generated as whole NumPy arrays and loaded with COPY, with explicit ids so
+links between tables need no round trips. The secondary indexes on review and
+review_tags are dropped for the load and built once at the end.
+
+Tables come in groups, each built from the ones before it:
+
+    catalog     school, department, course, tag, department_courses
+    professors  professor, professors_courses
+    reviews     review, review_tags
+
+--tables regenerates the given groups and every group after them, e.g.
+--tables reviews re-rolls only the reviews and keeps courses and professors.
+
+Reviews are skewed the way real traffic is, so caches and row locks see the
+same hot keys:
+
+    popularity  course popularity follows a Zipf law over course numbers, so
+                intro courses get most reviews; professors teaching a course
+                share its reviews by their own Zipf weight
+    ratings     each course has a latent difficulty and each professor a
+                latent quality; difficulty, workload and overall rating are
+                drawn around them, and tags lean with the overall rating
+    growth      every term gets --term-growth times the reviews of the last
+
+Reviews are generated in fixed-size shards by a process pool, each written as
+COPY text files for review and review_tags, then loaded over --workers
+connections at once. The same --seed gives the same data for any --workers.
+
+    uv run python scripts/generate_fake_data.py
+    uv run python scripts/generate_fake_data.py --scale 0.1 --seed 365
+    uv run python scripts/generate_fake_data.py --tables reviews --reviews 10000000 --workers 8
+    uv run python scripts/generate_fake_data.py --course-skew 0 --professor-skew 0 --term-growth 1
+"""
 import sqlalchemy
+import argparse
 import os
+import re
 import sys
-import dotenv
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
 from faker import Faker
 import numpy as np
 from pathlib import Path
@@ -11,30 +54,25 @@ import asyncio
 root_dir = Path(__file__).parent.parent
 sys.path.append(str(root_dir))
 
-try:
-    from src.api.routers.stats import refresh_all_statistics
-except ImportError as e:
-    print(f"Failed to import refresh_all_statistics: {e}")
-    refresh_all_statistics = lambda: None  # Dummy function if import fails
-
-# dotenv.load_dotenv()
-dotenv.load_dotenv(dotenv_path="default.env")
-db_url = os.getenv("POSTGRES_URI")
-
-# def database_connection_url():
-#     DB_USER = os.environ.get("POSTGRES_USER")
-#     DB_PASSWD = os.environ.get("POSTGRES_PASSWORD")
-#     DB_SERVER = os.environ.get("POSTGRES_SERVER")
-#     DB_PORT = os.environ.get("POSTGRES_PORT")
-#     DB_NAME = os.environ.get("POSTGRES_DB")
-#     return f"postgresql://{DB_USER}:{DB_PASSWD}@{DB_SERVER}:{DB_PORT}/{DB_NAME}"
-
-engine = sqlalchemy.create_engine(db_url, use_insertmanyvalues=True)
-fake = Faker()
-# Adjust numbers for larger dataset
-num_professors = 5000  # 5k professors
-num_reviews = 1000000  # 1M reviews
-num_reviews_per_batch = 10000  # Insert reviews in batches
+from src import config
+from src import database as db
+from src.api.routers.stats import refresh_all_statistics
+
+# sizes at --scale 1
+DEFAULT_PROFESSORS = 5000  # 5k professors
+DEFAULT_REVIEWS = 1000000  # 1M reviews
+
+# reviews per shard, fixed so a seed gives the same data for any worker count
+SHARD_SIZE = 100000
+
+# bytes per write when streaming a shard file into COPY
+COPY_BLOCK = 1 << 20
+
+# distinct comments and name parts, sampled with replacement
+COMMENT_POOL = 5000
+NAME_POOL = 1000
+
+MAX_TAGS_PER_REVIEW = 3
 
 departments = [
     ['Computer Science', 'CSC'],
@@ -77,247 +115,414 @@ tags = [
     'good'
 ]
 
+# how a tag leans with the overall rating, tags not listed are neutral
+tag_sentiment = {
+    'chill': 1,
+    'fun': 1,
+    'clear lectures': 1,
+    'fair grading': 1,
+    'good': 1,
+    'boring': -1,
+    'lame': -1
+}
+
 review_terms = ['Fall 2023', 'Winter 2024', 'Spring 2024', 'Fall 2024']
 
-with engine.begin() as conn:
-    conn.execute(sqlalchemy.text("""
-    DROP TABLE IF EXISTS course CASCADE;
-    DROP TABLE IF EXISTS professor CASCADE;
-    DROP TABLE IF EXISTS review CASCADE;
-    DROP TABLE IF EXISTS department CASCADE;
-    DROP TABLE IF EXISTS school CASCADE;
-    DROP TABLE IF EXISTS tag CASCADE;
-    DROP TABLE IF EXISTS department_courses CASCADE;
-    DROP TABLE IF EXISTS professors_courses CASCADE;
-    DROP TABLE IF EXISTS review_tags CASCADE;
-
-    CREATE TABLE
-        school (
-            id int generated always as identity not null PRIMARY KEY,
-            name text not null,
-            city text not null,
-            state text not null,
-            country text not null
-        );
-
-    CREATE TABLE
-        department (
-            id int generated always as identity not null PRIMARY KEY,
-            name text not null,
-            abbrev text not null,
-            school_id int not null references school(id)
-        );
-
-    CREATE TABLE
-        professor (
-            id int generated always as identity not null PRIMARY KEY,
-            name text not null,
-            department_id int not null references department(id),
-            avg_workload int,
-            avg_difficulty float,
-            avg_rating float,
-            total_reviews int
-        );
-
-    CREATE TABLE
-        course (
-            id int generated always as identity not null PRIMARY KEY,
-            course_code text not null,
-            name text not null,
-            department_id int references department(id),
-            avg_workload int,
-            avg_rating float
-        );
-
-    CREATE TABLE
-        review (
-            id int generated always as identity not null PRIMARY KEY,
-            course_id int not null references course(id),
-            term text not null,
-            difficulty int not null,
-            overall_rating int not null,
-            workload_rating int not null,
-            comments text not null
-        );
-
-    CREATE TABLE
-        tag (
-            id int generated always as identity not null PRIMARY KEY,
-            name text not null
-        );
-
-    CREATE TABLE
-        review_tags (
-            review_id int not null references review(id),
-            tag_id int not null references tag(id)
-        );
-
-    CREATE TABLE
-        professors_courses (
-            professor_id int not null references professor(id),
-            course_id int not null references course(id)
-        );
-
-    CREATE TABLE
-        department_courses (
-            department_id int not null references department(id),
-            course_id int not null references course(id)
-        );
-    """))
-
-    # Populate initial tables:
-
-    # Insert Cal Poly
-    conn.execute(sqlalchemy.text("""
-        INSERT INTO school (name, city, state, country)
-        VALUES (:name, :city, :state, :country);
-    """), {
-        "name": "California Polytechnic University",
-        "city": "San Luis Obispo",
-        "state": "California",
-        "country": "United States of America"
-    })
-
-    school_id = conn.execute(sqlalchemy.text("""
-        SELECT id FROM school WHERE name = :name
-    """), {"name": "California Polytechnic University"}).scalar_one()
-
-    # Insert departments
-    for department in departments:
-        print(f"inserting department: {department}")
-        conn.execute(sqlalchemy.text("""
-            INSERT INTO department (name, abbrev, school_id)
-            VALUES (:name, :abbrev, :school_id);
-        """), {
-            "name": department[0],
-            "abbrev": department[1],
-            "school_id": school_id
-        })
-
-    department_ids = conn.execute(sqlalchemy.text("""
-        SELECT id FROM department
-    """)).scalars().all()
-
-    # Insert professors
-    for professor in range(num_professors):
-        print(f"inserting professor: {professor}")
-        conn.execute(sqlalchemy.text("""
-            INSERT INTO professor (name, department_id)
-            VALUES (:name, :department_id);
-        """), {
-            "name": fake.name(),
-            "department_id": np.random.choice(department_ids)
-        })
-
-    professor_ids = conn.execute(sqlalchemy.text("""
-        SELECT id FROM professor
-    """)).scalars().all()
-
-    # Insert courses
-    for course in courses:
-        print(f"inserting course: {course}")
-        conn.execute(sqlalchemy.text("""
-            INSERT INTO course (course_code, name, department_id)
-            VALUES (:course_code, :name, :department_id);
-        """), {
-            "course_code": course[1],
-            "name": course[0],
-            "department_id": None
-        })
-
-    course_ids = conn.execute(sqlalchemy.text("""
-        SELECT id FROM course
-    """)).scalars().all()
-
-    for tag in tags:
-        print(f"inserting tag: {tag}")
-        conn.execute(sqlalchemy.text("""
-            INSERT INTO tag (name)
-            VALUES (:name);
-        """), {
-            "name": tag
-        })
-
-    # Generate reviews and get their IDs for review_tags
-    review_ids = []
-    for batch in range(0, num_reviews, num_reviews_per_batch):
-        print(f"Inserting reviews batch {batch // num_reviews_per_batch + 1} of {num_reviews // num_reviews_per_batch}")
-        
-        review_batch = [{
-            "course_id": np.random.choice(course_ids),
-            "term": np.random.choice(review_terms),
-            "difficulty": np.random.randint(0,6),
-            "overall_rating": np.random.randint(0,6),
-            "workload_rating": np.random.randint(0,200),
-            "comments": fake.sentence(nb_words=12)
-        } for _ in range(min(num_reviews_per_batch, num_reviews - batch))]
-        
-        for review in review_batch:
-            result = conn.execute(sqlalchemy.text("""
-                INSERT INTO review (course_id, term, difficulty, overall_rating, workload_rating, comments)
-                VALUES (:course_id, :term, :difficulty, :overall_rating, :workload_rating, :comments)
-                RETURNING id;
-            """), review).scalar_one()
-            review_ids.append(result)
-
-    print("Linking departments to courses...")
-    # Link departments to their courses based on course code prefix
-    fetched_courses = conn.execute(sqlalchemy.text("""
-        SELECT id, course_code FROM course
-    """)).fetchall()
-    for course_id, course_code in fetched_courses:
-        dept_abbrev = course_code[:3]  # Get department prefix (e.g., 'CSC' from 'CSC101')
-        dept_id = conn.execute(sqlalchemy.text("""
-            SELECT id FROM department WHERE abbrev = :abbrev
-        """), {"abbrev": dept_abbrev}).scalar()
-        
-        if dept_id:
-            conn.execute(sqlalchemy.text("""
-                INSERT INTO department_courses (department_id, course_id)
-                VALUES (:dept_id, :course_id)
-            """), {"dept_id": dept_id, "course_id": course_id})
-            
-            # Also update the course's department_id
-            conn.execute(sqlalchemy.text("""
-                UPDATE course 
-                SET department_id = :dept_id 
-                WHERE id = :course_id
-            """), {"dept_id": dept_id, "course_id": course_id})
-
-    print("Linking professors to courses...")
-    # Assign professors to courses (each professor teaches 2-5 courses)
-    for prof_id in professor_ids:
-        num_courses = np.random.randint(2, 6)
-        # Get random courses from the professor's department
-        dept_id = conn.execute(sqlalchemy.text("""
-            SELECT department_id FROM professor WHERE id = :prof_id
-        """), {"prof_id": prof_id}).scalar()
-        
-        dept_courses = conn.execute(sqlalchemy.text("""
-            SELECT id FROM course WHERE department_id = :dept_id
-        """), {"dept_id": dept_id}).scalars().all()
-        
-        if dept_courses:
-            selected_courses = np.random.choice(dept_courses, 
-                                             size=min(num_courses, len(dept_courses)), 
-                                             replace=False)
-            for course_id in selected_courses:
-                conn.execute(sqlalchemy.text("""
-                    INSERT INTO professors_courses (professor_id, course_id)
-                    VALUES (:prof_id, :course_id)
-                """), {"prof_id": prof_id, "course_id": course_id})
-
-    print("Adding tags to reviews...")
-    # Add 1-3 random tags to each review
-    tag_ids = conn.execute(sqlalchemy.text("SELECT id FROM tag")).scalars().all()
-    for review_id in review_ids:
-        num_tags = np.random.randint(1, 4)
-        selected_tags = np.random.choice(tag_ids, size=num_tags, replace=False)
-        for tag_id in selected_tags:
-            conn.execute(sqlalchemy.text("""
-                INSERT INTO review_tags (review_id, tag_id)
-                VALUES (:review_id, :tag_id)
-            """), {"review_id": review_id, "tag_id": tag_id})
-
-    # print("Refreshing statistics...")
-    # asyncio.run(refresh_all_statistics())
+# in build order, a group only reads the groups before it
+TABLE_GROUPS = {
+    'catalog': ['school', 'department', 'course', 'tag', 'department_courses'],
+    'professors': ['professor', 'professors_courses'],
+    'reviews': ['review', 'review_tags'],
+}
+
+# derived from the seeded tables by refresh_all_statistics
+ROLLUP_TABLES = [
+    'course_term_stats',
+    'course_tag_counts',
+    'professor_tag_counts',
+    'department_stats',
+    'department_tag_counts'
+]
+
+# tables whose secondary indexes are rebuilt after the load instead of during it
+BULK_TABLES = ['review', 'review_tags']
+
+REVIEW_COLUMNS = [
+    'id', 'course_id', 'professor_id', 'term', 'difficulty',
+    'overall_rating', 'workload_rating', 'comments'
+]
+REVIEW_TAG_COLUMNS = ['review_id', 'tag_id']
+
+
+@dataclass
+class Distributions:
+    """Shape of the generated reviews, 0 skew and 1 growth are uniform."""
+    course_skew: float = 1.1
+    professor_skew: float = 0.8
+    term_growth: float = 1.5
+
+
+@dataclass
+class ReviewModel:
+    """Everything a shard worker needs to draw reviews, read once from the database."""
+    teaching: np.ndarray  # (course_id, professor_id) pairs
+    teaching_weights: np.ndarray  # probability of a review going to each pair
+    course_difficulty: np.ndarray  # latent, indexed by course id
+    professor_quality: np.ndarray  # latent, indexed by professor id
+    terms: np.ndarray
+    term_weights: np.ndarray
+    tag_ids: np.ndarray
+    tag_sentiment: np.ndarray
+    comments: np.ndarray
+
+
+def clean(text: str) -> str:
+    """Keep a value safe inside COPY's text format."""
+    return re.sub(r"[\t\n\r\\]", " ", text)
+
+
+def tsv(*columns) -> str:
+    """Rows for COPY ... FROM STDIN, one column per array or list."""
+    columns = [column.astype(str).tolist() if isinstance(column, np.ndarray) else column for column in columns]
+    return "\n".join(map("\t".join, zip(*columns))) + "\n"
+
+
+def copy(conn, table: str, columns: list[str], chunks) -> None:
+    """COPY every chunk of rows produced by `chunks` into `table`."""
+    cursor = conn.connection.driver_connection.cursor()
+    with cursor.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as stream:
+        for chunk in chunks:
+            stream.write(chunk)
+
+
+def zipf_weights(count: int, skew: float) -> np.ndarray:
+    """Normalized weight of each rank 1..count under a Zipf law."""
+    weights = 1 / np.arange(1, count + 1) ** skew
+    return weights / weights.sum()
+
+
+def top_k(rng: np.random.Generator, logits: np.ndarray, counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Draw counts[i] distinct columns for every row i of `logits`, each with
+    probability proportional to exp(logit), without replacement (Gumbel top-k).
+    Returns the (row, column) index of every draw.
+    """
+    k = counts.max()
+    ranked = np.argsort(-(logits + rng.gumbel(size=logits.shape)), axis=1)[:, :k]
+    chosen = np.arange(k) < counts[:, None]
+    rows = np.broadcast_to(np.arange(len(logits))[:, None], ranked.shape)
+    return rows[chosen], ranked[chosen]
+
+
+def seed_catalog(conn) -> None:
+    copy(conn, 'school', ['id', 'name', 'city', 'state', 'country'], [tsv(
+        ['1'],
+        ['California Polytechnic University'],
+        ['San Luis Obispo'],
+        ['California'],
+        ['United States of America']
+    )])
+
+    department_ids = {abbrev: i + 1 for i, (_, abbrev) in enumerate(departments)}
+    copy(conn, 'department', ['id', 'name', 'abbrev', 'school_id'], [tsv(
+        np.arange(1, len(departments) + 1),
+        [name for name, _ in departments],
+        list(department_ids),
+        ['1'] * len(departments)
+    )])
+
+    # department from the course code prefix, e.g. 'CSC' from 'CSC101'
+    course_departments = np.array([department_ids[re.match(r"[A-Z]+", code).group(0)] for _, code in courses])
+    course_ids = np.arange(1, len(courses) + 1)
+    copy(conn, 'course', ['id', 'course_code', 'name', 'department_id'], [tsv(
+        course_ids,
+        [code for _, code in courses],
+        [name for name, _ in courses],
+        course_departments
+    )])
+    copy(conn, 'department_courses', ['department_id', 'course_id'], [tsv(course_departments, course_ids)])
+
+    copy(conn, 'tag', ['id', 'name'], [tsv(np.arange(1, len(tags) + 1), tags)])
+
+
+def seed_professors(conn, rng: np.random.Generator, fake: Faker, num_professors: int) -> None:
+    department_courses = np.array(conn.execute(sqlalchemy.text(
+        "SELECT department_id, course_id FROM department_courses ORDER BY department_id, course_id"
+    )).all()).reshape(-1, 2)
+    department_ids = np.unique(department_courses[:, 0])
+
+    first_names = np.array([clean(fake.first_name()) for _ in range(NAME_POOL)], dtype=object)
+    last_names = np.array([clean(fake.last_name()) for _ in range(NAME_POOL)], dtype=object)
+    professor_ids = np.arange(1, num_professors + 1)
+    professor_departments = rng.choice(department_ids, size=num_professors)
+    names = first_names[rng.integers(NAME_POOL, size=num_professors)] + " " + last_names[rng.integers(NAME_POOL, size=num_professors)]
+    copy(conn, 'professor', ['id', 'name', 'department_id'], [tsv(professor_ids, names.tolist(), professor_departments)])
+
+    # each professor teaches 2-5 distinct courses of their department
+    teaching = []
+    for department_id in department_ids:
+        department_course_ids = department_courses[department_courses[:, 0] == department_id, 1]
+        professors = professor_ids[professor_departments == department_id]
+        if not len(professors):
+            continue
+        counts = np.minimum(rng.integers(2, 6, size=len(professors)), len(department_course_ids))
+        rows, columns = top_k(rng, np.zeros((len(professors), len(department_course_ids))), counts)
+        teaching.append((professors[rows], department_course_ids[columns]))
+    copy(conn, 'professors_courses', ['professor_id', 'course_id'], [
+        tsv(professors, course_ids) for professors, course_ids in teaching
+    ])
+
+
+def review_model(conn, rng: np.random.Generator, fake: Faker, distributions: Distributions) -> ReviewModel:
+    # reviews are written for a course together with one of its professors
+    teaching = np.array(conn.execute(sqlalchemy.text(
+        "SELECT course_id, professor_id FROM professors_courses ORDER BY course_id, professor_id"
+    )).all()).reshape(-1, 2)
+    if not len(teaching):
+        raise ValueError("No professor teaches any course, seed the professors first")
+    course_rows = conn.execute(sqlalchemy.text("SELECT id, course_code FROM course ORDER BY id")).all()
+    professor_ids = np.array(conn.execute(sqlalchemy.text("SELECT id FROM professor ORDER BY id")).scalars().all())
+    tag_rows = conn.execute(sqlalchemy.text("SELECT id, name FROM tag ORDER BY id")).all()
+
+    # intro courses first: rank by course number, ties in random order
+    course_ids = np.array([course.id for course in course_rows])
+    numbers = np.array([int(re.sub(r"\D", "", course.course_code) or 0) for course in course_rows])
+    by_popularity = course_ids[np.lexsort((rng.random(len(course_ids)), numbers))]
+    course_weight = np.zeros(course_ids.max() + 1)
+    course_weight[by_popularity] = zipf_weights(len(by_popularity), distributions.course_skew)
+
+    professor_weight = np.zeros(professor_ids.max() + 1)
+    professor_weight[rng.permutation(professor_ids)] = zipf_weights(len(professor_ids), distributions.professor_skew)
+
+    # P(course) * P(professor | course), among the professors teaching it
+    pair_weight = professor_weight[teaching[:, 1]]
+    teaching_share = np.bincount(teaching[:, 0], weights=pair_weight, minlength=len(course_weight))
+    pair_weight = course_weight[teaching[:, 0]] * pair_weight / teaching_share[teaching[:, 0]]
+    pair_weight /= pair_weight.sum()
+
+    term_weights = distributions.term_growth ** np.arange(len(review_terms))
+
+    return ReviewModel(
+        teaching=teaching,
+        teaching_weights=pair_weight,
+        course_difficulty=rng.normal(0, 0.8, size=course_ids.max() + 1),
+        professor_quality=rng.normal(0, 0.8, size=professor_ids.max() + 1),
+        terms=np.array(review_terms, dtype=object),
+        term_weights=term_weights / term_weights.sum(),
+        tag_ids=np.array([tag.id for tag in tag_rows]),
+        tag_sentiment=np.array([tag_sentiment.get(tag.name, 0) for tag in tag_rows], dtype=float),
+        comments=np.array([clean(fake.sentence(nb_words=12)) for _ in range(COMMENT_POOL)], dtype=object)
+    )
+
+
+def write_shard(model: ReviewModel, start: int, size: int, seed: np.random.SeedSequence, directory: Path) -> tuple[Path, Path]:
+    """Draw reviews start+1..start+size and write them as COPY files, runs in a worker process."""
+    rng = np.random.default_rng(seed)
+    review_ids = np.arange(start + 1, start + size + 1)
+    pairs = model.teaching[rng.choice(len(model.teaching), size=size, p=model.teaching_weights)]
+    difficulty = np.clip(np.rint(3 + model.course_difficulty[pairs[:, 0]] + rng.normal(0, 0.8, size=size)), 1, 5)
+    overall = np.clip(np.rint(
+        3.3 + model.professor_quality[pairs[:, 1]] - 0.3 * (difficulty - 3) + rng.normal(0, 0.8, size=size)
+    ), 1, 5)
+    # hours per week, heavier for harder courses
+    workload = np.clip(np.rint(rng.gamma(2, 1.5 * difficulty)), 0, 168)
+
+    review_path = directory / f"review.{start // SHARD_SIZE:05}.tsv"
+    review_path.write_text(tsv(
+        review_ids,
+        pairs[:, 0],
+        pairs[:, 1],
+        model.terms[rng.choice(len(model.terms), size=size, p=model.term_weights)].tolist(),
+        difficulty.astype(int),
+        overall.astype(int),
+        workload.astype(int),
+        model.comments[rng.integers(len(model.comments), size=size)].tolist()
+    ))
+
+    # 1-3 distinct tags per review, positive ones more likely on good reviews
+    per_review = min(MAX_TAGS_PER_REVIEW, len(model.tag_ids))
+    logits = 1.5 * ((overall - 3) / 2)[:, None] * model.tag_sentiment[None, :]
+    rows, columns = top_k(rng, logits, rng.integers(1, per_review + 1, size=size))
+    tag_path = directory / f"review_tags.{start // SHARD_SIZE:05}.tsv"
+    tag_path.write_text(tsv(review_ids[rows], model.tag_ids[columns]))
+
+    return review_path, tag_path
+
+
+def write_shards(model: ReviewModel, num_reviews: int, seed: np.random.SeedSequence, directory: Path, workers: int) -> list[tuple[Path, Path]]:
+    starts = range(0, num_reviews, SHARD_SIZE)
+    seeds = seed.spawn(len(starts))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(write_shard, model, start, min(SHARD_SIZE, num_reviews - start), shard_seed, directory)
+            for start, shard_seed in zip(starts, seeds)
+        ]
+        shards = []
+        for future in futures:
+            shards.append(future.result())
+            print(f"generated {min(len(shards) * SHARD_SIZE, num_reviews)}/{num_reviews} reviews")
+    return shards
+
+
+def load_file(engine, table: str, columns: list[str], path: Path) -> None:
+    with engine.begin() as conn, path.open() as file:
+        copy(conn, table, columns, iter(lambda: file.read(COPY_BLOCK), ""))
+
+
+def load_shards(engine, shards: list[tuple[Path, Path]], workers: int) -> None:
+    """COPY the shards over `workers` connections, every review before any of its tags."""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for table, columns, paths in (
+            ('review', REVIEW_COLUMNS, [review_path for review_path, _ in shards]),
+            ('review_tags', REVIEW_TAG_COLUMNS, [tag_path for _, tag_path in shards]),
+        ):
+            for done, _ in enumerate(pool.map(lambda path: load_file(engine, table, columns, path), paths), 1):
+                print(f"loaded {table} shard {done}/{len(paths)}")
+
+
+def drop_indexes(conn, tables: list[str]) -> list[str]:
+    """Drop the indexes of `tables` that back no constraint, return their definitions."""
+    indexes = conn.execute(sqlalchemy.text(
+        """
+        SELECT i.indexname, i.indexdef
+        FROM pg_indexes i
+        WHERE i.schemaname = current_schema()
+        AND i.tablename = ANY(:tables)
+        AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conname = i.indexname)
+        """
+    ), {"tables": tables}).all()
+    for index in indexes:
+        conn.execute(sqlalchemy.text(f'DROP INDEX "{index.indexname}"'))
+    return [index.indexdef for index in indexes]
+
+
+def reset_sequences(conn, tables: list[str]) -> None:
+    """Move id sequences past the explicit ids that were copied in."""
+    for table in tables:
+        conn.execute(sqlalchemy.text(
+            f"""
+            SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 0) + 1, false)
+            FROM {table}
+            """
+        ))
+
+
+def timed(label: str, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    print(f"{label}: {time.perf_counter() - start:.1f}s")
+    return result
+
+
+def seed(
+    num_reviews: int = DEFAULT_REVIEWS,
+    num_professors: int = DEFAULT_PROFESSORS,
+    random_seed: int | None = None,
+    groups: list[str] | None = None,
+    distributions: Distributions | None = None,
+    workers: int | None = None,
+    shard_dir: Path | None = None
+) -> None:
+    """
+    Replace the given table groups, and every group built from them, with a
+    fresh fake dataset. All groups by default. Review shards are written to
+    `shard_dir` and kept, or to a temporary directory that is removed.
+    """
+    order = list(TABLE_GROUPS)
+    rebuilt = order[min(order.index(group) for group in groups or order):]
+    tables = [table for group in rebuilt for table in TABLE_GROUPS[group]]
+    distributions = distributions or Distributions()
+    workers = workers or os.cpu_count()
+    print(f"regenerating {', '.join(rebuilt)}")
+
+    root_seed = np.random.SeedSequence(random_seed)
+    main_seed, shard_seed = root_seed.spawn(2)
+    rng = np.random.default_rng(main_seed)
+    fake = Faker()
+    if random_seed is not None:
+        fake.seed_instance(random_seed)
+
+    start = time.perf_counter()
+    engine = sqlalchemy.create_engine(config.get_settings().POSTGRES_URI, pool_size=workers, max_overflow=0)
+    with engine.begin() as conn:
+        conn.execute(sqlalchemy.text(f"TRUNCATE {', '.join(tables + ROLLUP_TABLES)} CASCADE"))
+        indexes = drop_indexes(conn, [table for table in BULK_TABLES if table in tables])
+
+        if 'catalog' in rebuilt:
+            timed("catalog", seed_catalog, conn)
+        if 'professors' in rebuilt:
+            timed("professors", seed_professors, conn, rng, fake, num_professors)
+        if 'reviews' in rebuilt:
+            model = review_model(conn, rng, fake, distributions)
+
+    try:
+        if 'reviews' in rebuilt and num_reviews > 0:
+            with tempfile.TemporaryDirectory() as temporary:
+                directory = shard_dir or Path(temporary)
+                directory.mkdir(parents=True, exist_ok=True)
+                shards = timed("generate reviews", write_shards, model, num_reviews, shard_seed, directory, workers)
+                timed("load reviews", load_shards, engine, shards, workers)
+    finally:
+        # also after a failed load, the dropped indexes are not left missing
+        with engine.begin() as conn:
+            conn.execute(sqlalchemy.text("SET LOCAL maintenance_work_mem = '512MB'"))
+
+            def build_indexes():
+                for definition in indexes:
+                    conn.execute(sqlalchemy.text(definition))
+
+            timed("indexes", build_indexes)
+            reset_sequences(conn, [table for table in tables if table in ('school', 'department', 'course', 'tag', 'professor', 'review')])
+            timed("analyze", conn.execute, sqlalchemy.text(f"ANALYZE {', '.join(tables)}"))
+        engine.dispose()
+
+    timed("statistics", asyncio.run, refresh_statistics())
+    print(f"seeded in {time.perf_counter() - start:.1f}s")
+
+
+async def refresh_statistics() -> None:
+    try:
+        # one chunk per phase, nothing else is writing
+        await refresh_all_statistics(chunk_size=100000)
+    finally:
+        # its connections belong to this event loop
+        await db.engine.dispose()
+
+
+def main():
+    defaults = Distributions()
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scale", type=float, default=1.0, help=f"1 is {DEFAULT_REVIEWS} reviews and {DEFAULT_PROFESSORS} professors")
+    parser.add_argument("--reviews", type=int, help="number of reviews, overrides --scale")
+    parser.add_argument("--professors", type=int, help="number of professors, overrides --scale")
+    parser.add_argument("--seed", type=int, help="random seed, for a reproducible dataset")
+    parser.add_argument(
+        "--tables",
+        type=lambda value: value.split(","),
+        default=list(TABLE_GROUPS),
+        help=f"comma separated groups to regenerate: {', '.join(TABLE_GROUPS)}"
+    )
+    parser.add_argument("--course-skew", type=float, default=defaults.course_skew, help="Zipf exponent of course popularity, 0 is uniform")
+    parser.add_argument("--professor-skew", type=float, default=defaults.professor_skew, help="Zipf exponent of professor popularity, 0 is uniform")
+    parser.add_argument("--term-growth", type=float, default=defaults.term_growth, help="reviews in a term over the term before, 1 is flat")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processes generating shards and connections loading them")
+    parser.add_argument("--shard-dir", type=Path, help="keep the review shard files here, e.g. to load them again with psql \\copy")
+    args = parser.parse_args()
+
+    unknown = set(args.tables) - set(TABLE_GROUPS)
+    if unknown:
+        parser.error(f"unknown table groups: {', '.join(sorted(unknown))}")
+
+    seed(
+        args.reviews if args.reviews is not None else round(DEFAULT_REVIEWS * args.scale),
+        args.professors if args.professors is not None else max(1, round(DEFAULT_PROFESSORS * args.scale)),
+        args.seed,
+        args.tables,
+        Distributions(args.course_skew, args.professor_skew, args.term_growth),
+        args.workers,
+        args.shard_dir
+    )
+
+
+if __name__ == "__main__":
+    main()
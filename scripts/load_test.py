@@ -0,0 +1,487 @@
+"""
+Load test the API over HTTP and compare the results against a stored baseline.
+
+Seed a local database first (scripts/generate_fake_data.py) and start the
+server (uv run main.py). The harness discovers real course codes, professors,
+departments and tags through the API, then runs each concurrency level for a
+fixed duration. Every worker sends requests picked at random from the mix and
+waits for each response before sending the next. Latency percentiles,
+throughput, error counts and the X-Cache hit ratio are reported per route.
+
+Mixes:
+    read   - every GET route, weighted roughly like real traffic
+    mixed  - read plus review creation and course attachment, the default
+    write  - every POST route, including /stats/refresh
+    all    - read and write together, covers every route
+
+Writes change the seeded data. Re-seed before recording a baseline that
+later runs should be compared against.
+
+    uv run python scripts/load_test.py --mix mixed --concurrency 1,8,32
+    uv run python scripts/load_test.py --mix all --save-baseline
+"""
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+import argparse
+import asyncio
+import datetime
+import json
+import random
+import statistics
+import string
+import sys
+import time
+import httpx
+import sqlalchemy
+
+# Add the project root to Python path
+root_dir = Path(__file__).parent.parent
+sys.path.append(str(root_dir))
+
+from src import config
+
+DEFAULT_BASELINE = root_dir / "benchmarks" / "load_test_baseline.json"
+
+TERMS = ["Fall 2023", "Winter 2024", "Spring 2024", "Fall 2024"]
+SEARCH_TERMS = ["group project", "clear lectures", "fair grading", "exams", "homework"]
+FALLBACK_TAGS = ["fun", "chill", "clear lectures", "fair grading", "uploads slides"]
+
+
+@dataclass
+class Fixtures:
+    """Real keys to put in request paths, discovered through the API."""
+    course_codes: list[str]
+    departments: list[str]
+    school_ids: list[int]
+    professors: list[tuple[int, str]]
+    # (course_code, professor_id) pairs that create_review accepts
+    teaching: list[tuple[str, int]]
+    tags: list[str]
+
+
+@dataclass
+class Route:
+    name: str
+    # (rng, fixtures) -> (method, path, httpx request arguments)
+    build: Callable[[random.Random, Fixtures], tuple[str, str, dict]]
+    write: bool = False
+
+
+@dataclass
+class Samples:
+    latencies: list[float] = field(default_factory=list)
+    client_errors: int = 0
+    server_errors: int = 0
+    cache_hits: int = 0
+    cache_lookups: int = 0
+
+
+def random_letters(rng: random.Random, count: int) -> str:
+    return "".join(rng.choices(string.ascii_uppercase, k=count))
+
+
+def new_review(rng: random.Random, fixtures: Fixtures) -> dict:
+    course_code, professor_id = rng.choice(fixtures.teaching)
+    return {
+        "course_code": course_code,
+        "professor_id": professor_id,
+        "term": rng.choice(TERMS),
+        "difficulty_rating": rng.randint(1, 5),
+        "overall_rating": rng.randint(1, 5),
+        "workload_estimate": rng.randint(0, 20),
+        "tags": rng.sample(fixtures.tags, min(2, len(fixtures.tags))),
+        "comments": "Submitted by the load test, long enough to pass validation."
+    }
+
+
+ROUTES = [
+    Route("GET /courses/", lambda rng, f: (
+        "GET", "/courses/",
+        {"params": {"department": rng.choice(f.departments), "sort_by": rng.choice(["workload", "rating"])}}
+    )),
+    Route("GET /courses/{course_code}", lambda rng, f: (
+        "GET", f"/courses/{rng.choice(f.course_codes)}", {}
+    )),
+    Route("GET /courses/{course_code}/professors", lambda rng, f: (
+        "GET", f"/courses/{rng.choice(f.course_codes)}/professors", {}
+    )),
+    Route("GET /courses/{course_code}/statistics", lambda rng, f: (
+        "GET", f"/courses/{rng.choice(f.course_codes)}/statistics", {}
+    )),
+    Route("GET /courses/{course_code}/trends", lambda rng, f: (
+        "GET", f"/courses/{rng.choice(f.course_codes)}/trends", {}
+    )),
+    Route("GET /professors/{professor_id}", lambda rng, f: (
+        "GET", f"/professors/{rng.choice(f.professors)[0]}", {}
+    )),
+    Route("GET /professors/search/by-tags", lambda rng, f: (
+        "GET", "/professors/search/by-tags", {"params": {"tags": rng.sample(f.tags, min(2, len(f.tags)))}}
+    )),
+    Route("GET /reviews/course/{course_code}", lambda rng, f: (
+        "GET", f"/reviews/course/{rng.choice(f.course_codes)}", {"params": {"limit": 50}}
+    )),
+    Route("GET /reviews/professor/{professor_name}", lambda rng, f: (
+        "GET", f"/reviews/professor/{rng.choice(f.professors)[1]}", {"params": {"limit": 50}}
+    )),
+    Route("GET /reviews/search", lambda rng, f: (
+        "GET", "/reviews/search", {"params": {"q": rng.choice(SEARCH_TERMS), "limit": 20}}
+    )),
+    Route("GET /reviews/export", lambda rng, f: (
+        "GET", "/reviews/export", {"params": {"course_code": rng.choice(f.course_codes)}}
+    )),
+    Route("GET /departments/", lambda rng, f: (
+        "GET", "/departments/", {"params": {"limit": 10, "offset": 0}}
+    )),
+    Route("GET /departments/{department_abbrev}/statistics", lambda rng, f: (
+        "GET", f"/departments/{rng.choice(f.departments)}/statistics", {}
+    )),
+    Route("POST /reviews/", lambda rng, f: (
+        "POST", "/reviews/", {"json": new_review(rng, f)}
+    ), write=True),
+    Route("POST /reviews/bulk", lambda rng, f: (
+        "POST", "/reviews/bulk", {"json": [new_review(rng, f) for _ in range(50)]}
+    ), write=True),
+    Route("POST /professors/", lambda rng, f: (
+        "POST", "/professors/", {"json": {
+            "name": f"Load Test {random_letters(rng, 8).title()}",
+            "department": rng.choice(f.departments)
+        }}
+    ), write=True),
+    Route("POST /professors/{professor_id}/courses", lambda rng, f: (
+        "POST", f"/professors/{rng.choice(f.professors)[0]}/courses", {"json": [rng.choice(f.course_codes)]}
+    ), write=True),
+    Route("POST /courses/", lambda rng, f: (
+        "POST", "/courses/", {"json": {
+            "course_code": f"{random_letters(rng, 3)}{rng.randint(1000, 9999)}",
+            "name": "Load Test Course",
+            "department": rng.choice(f.departments)
+        }}
+    ), write=True),
+    Route("POST /departments/", lambda rng, f: (
+        "POST", "/departments/", {"json": {
+            "name": f"Load Test {random_letters(rng, 8).title()}",
+            "abbrev": random_letters(rng, 8),
+            "school_id": rng.choice(f.school_ids)
+        }}
+    ), write=True),
+    Route("POST /stats/refresh", lambda rng, f: (
+        "POST", "/stats/refresh", {}
+    ), write=True),
+]
+
+ROUTES_BY_NAME = {route.name: route for route in ROUTES}
+
+READ_WEIGHTS = {
+    "GET /courses/": 5,
+    "GET /courses/{course_code}": 15,
+    "GET /courses/{course_code}/professors": 5,
+    "GET /courses/{course_code}/statistics": 10,
+    "GET /courses/{course_code}/trends": 5,
+    "GET /professors/{professor_id}": 15,
+    "GET /professors/search/by-tags": 3,
+    "GET /reviews/course/{course_code}": 12,
+    "GET /reviews/professor/{professor_name}": 8,
+    "GET /reviews/search": 5,
+    "GET /reviews/export": 1,
+    "GET /departments/": 5,
+    "GET /departments/{department_abbrev}/statistics": 6,
+}
+WRITE_WEIGHTS = {
+    "POST /reviews/": 40,
+    "POST /reviews/bulk": 5,
+    "POST /professors/": 10,
+    "POST /professors/{professor_id}/courses": 10,
+    "POST /courses/": 10,
+    "POST /departments/": 5,
+    "POST /stats/refresh": 1,
+}
+
+# route name -> relative share of the requests
+MIXES = {
+    "read": READ_WEIGHTS,
+    "mixed": READ_WEIGHTS | {"POST /reviews/": 8, "POST /professors/{professor_id}/courses": 1},
+    "write": WRITE_WEIGHTS,
+    "all": READ_WEIGHTS | WRITE_WEIGHTS,
+}
+
+
+async def discover(client: httpx.AsyncClient) -> Fixtures:
+    departments = (await client.get("/departments/", params={"limit": 1000})).raise_for_status().json()
+    courses = (await client.get("/courses/")).raise_for_status().json()
+
+    professors = {}
+    teaching = []
+    for course in courses:
+        for professor in course["professors"]:
+            professors[int(professor["id"])] = professor["name"]
+            teaching.append((course["course_code"], int(professor["id"])))
+    if not teaching:
+        sys.exit("No professor teaches any course, seed the database first")
+
+    # tag names are only exposed through professor details
+    tags = set()
+    for professor_id in list(professors)[:20]:
+        details = (await client.get(f"/professors/{professor_id}")).raise_for_status().json()
+        tags.update(details["most_common_tags"])
+
+    return Fixtures(
+        course_codes=sorted({course["course_code"] for course in courses}),
+        departments=[department["abbrev"] for department in departments["departments"]],
+        school_ids=sorted({department["school_id"] for department in departments["departments"]}),
+        professors=sorted(professors.items()),
+        teaching=teaching,
+        tags=sorted(tags) or FALLBACK_TAGS
+    )
+
+
+def dataset_size() -> dict | None:
+    """Row counts of the seeded database, recorded with the results."""
+    try:
+        engine = sqlalchemy.create_engine(config.get_settings().POSTGRES_URI)
+        with engine.connect() as connection:
+            return {
+                table: connection.execute(sqlalchemy.text(f"SELECT count(*) FROM {table}")).scalar_one()
+                for table in ("course", "professor", "review", "review_tags")
+            }
+    except Exception as e:
+        print(f"could not count rows in the database: {e}")
+        return None
+
+
+async def worker(
+    mix: dict[str, int],
+    reader: httpx.AsyncClient,
+    writer: httpx.AsyncClient,
+    fixtures: Fixtures,
+    rng: random.Random,
+    deadline: float,
+    samples: dict[str, Samples] | None
+) -> None:
+    routes = [ROUTES_BY_NAME[name] for name in mix]
+    weights = list(mix.values())
+    while time.perf_counter() < deadline:
+        route = rng.choices(routes, weights)[0]
+        method, url, kwargs = route.build(rng, fixtures)
+        # writes pin their client to the primary with a cookie, keep readers off it
+        client = writer if route.write else reader
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            status = response.status_code
+            cache_header = response.headers.get("X-Cache")
+        except httpx.HTTPError as e:
+            print(f"{route.name}: {e!r}")
+            status = 599
+            cache_header = None
+        elapsed = time.perf_counter() - start
+
+        if samples is None:
+            continue
+        sample = samples.setdefault(route.name, Samples())
+        sample.latencies.append(elapsed)
+        if 400 <= status < 500:
+            sample.client_errors += 1
+        elif status >= 500:
+            sample.server_errors += 1
+        if cache_header is not None:
+            sample.cache_lookups += 1
+            sample.cache_hits += cache_header == "HIT"
+
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def summarize(sample: Samples, elapsed: float) -> dict:
+    ordered = sorted(sample.latencies)
+    summary = {
+        "requests": len(ordered),
+        "client_errors": sample.client_errors,
+        "server_errors": sample.server_errors,
+        "throughput_rps": round(len(ordered) / elapsed, 2),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 2),
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+    }
+    if sample.cache_lookups:
+        summary["cache_hit_ratio"] = round(sample.cache_hits / sample.cache_lookups, 3)
+    return summary
+
+
+async def run_level(args, mix: dict[str, int], fixtures: Fixtures, concurrency: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    timeout = httpx.Timeout(args.timeout)
+    async with (
+        httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=timeout) as reader,
+        httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=timeout) as writer
+    ):
+        rngs = [random.Random(f"{args.seed}-{concurrency}-{i}") for i in range(concurrency)]
+
+        if args.warmup > 0:
+            deadline = time.perf_counter() + args.warmup
+            await asyncio.gather(*(
+                worker(mix, reader, writer, fixtures, rng, deadline, None) for rng in rngs
+            ))
+
+        samples: dict[str, Samples] = {}
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*(
+            worker(mix, reader, writer, fixtures, rng, deadline, samples) for rng in rngs
+        ))
+        # the last requests finish after the deadline
+        elapsed = time.perf_counter() - start
+
+    total = Samples()
+    for sample in samples.values():
+        total.latencies += sample.latencies
+        total.client_errors += sample.client_errors
+        total.server_errors += sample.server_errors
+        total.cache_hits += sample.cache_hits
+        total.cache_lookups += sample.cache_lookups
+
+    return {
+        "mix": args.mix,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "total": summarize(total, elapsed) if total.latencies else None,
+        "routes": {name: summarize(samples[name], elapsed) for name in sorted(samples)}
+    }
+
+
+def print_level(result: dict) -> None:
+    print(f"\n{result['mix']} mix, concurrency {result['concurrency']}, {result['seconds']}s")
+    print(f"{'route':<48}{'reqs':>7}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'4xx':>6}{'5xx':>6}{'hit':>7}")
+    rows = list(result["routes"].items())
+    if result["total"]:
+        rows.append(("total", result["total"]))
+    for name, summary in rows:
+        hit = summary.get("cache_hit_ratio")
+        print(
+            f"{name:<48}{summary['requests']:>7}{summary['throughput_rps']:>9.1f}"
+            f"{summary['p50_ms']:>9.1f}{summary['p95_ms']:>9.1f}{summary['p99_ms']:>9.1f}"
+            f"{summary['client_errors']:>6}{summary['server_errors']:>6}"
+            f"{'' if hit is None else f'{hit:.2f}':>7}"
+        )
+
+
+def compare(results: list[dict], baseline: dict, tolerance: float, min_delta_ms: float) -> list[str]:
+    """
+    Changes against the baseline per route and concurrency level. A route
+    regresses when its p95 or p99 grows, or its throughput drops, by more than
+    `tolerance`; latency changes under `min_delta_ms` are treated as noise.
+    """
+    recorded = {(run["mix"], run["concurrency"]): run for run in baseline["runs"]}
+    regressions = []
+    for result in results:
+        before = recorded.get((result["mix"], result["concurrency"]))
+        if before is None:
+            print(f"\nno baseline for the {result['mix']} mix at concurrency {result['concurrency']}")
+            continue
+
+        print(f"\nvs baseline: {result['mix']} mix, concurrency {result['concurrency']}")
+        print(f"{'route':<48}{'p50':>9}{'p95':>9}{'p99':>9}{'rps':>9}")
+        for name, summary in result["routes"].items():
+            old = before["routes"].get(name)
+            if old is None:
+                continue
+            changes = {
+                key: (summary[key] - old[key]) / old[key] if old[key] else 0.0
+                for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps")
+            }
+            slower = [
+                key for key in ("p95_ms", "p99_ms")
+                if changes[key] > tolerance and summary[key] - old[key] > min_delta_ms
+            ]
+            if changes["throughput_rps"] < -tolerance:
+                slower.append("throughput_rps")
+            flag = "  REGRESSION" if slower else ""
+            print(
+                f"{name:<48}{changes['p50_ms']:>+9.0%}{changes['p95_ms']:>+9.0%}"
+                f"{changes['p99_ms']:>+9.0%}{changes['throughput_rps']:>+9.0%}{flag}"
+            )
+            for key in slower:
+                regressions.append(
+                    f"{result['mix']}@{result['concurrency']} {name}: {key} {old[key]} -> {summary[key]}"
+                )
+    return regressions
+
+
+async def run(args) -> int:
+    mix = MIXES[args.mix]
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as client:
+        fixtures = await discover(client)
+    print(
+        f"{len(fixtures.course_codes)} courses, {len(fixtures.professors)} professors, "
+        f"{len(fixtures.departments)} departments, {len(fixtures.tags)} tags"
+    )
+
+    results = []
+    for concurrency in args.concurrency:
+        result = await run_level(args, mix, fixtures, concurrency)
+        print_level(result)
+        results.append(result)
+
+    report = {
+        "recorded_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "base_url": args.base_url,
+        "dataset": dataset_size(),
+        "duration": args.duration,
+        "warmup": args.warmup,
+        "seed": args.seed,
+        "runs": results
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(report, indent=2))
+        print(f"\nbaseline saved to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"\nno baseline at {args.baseline}, record one with --save-baseline")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text())
+    if baseline.get("dataset") != report["dataset"]:
+        print(f"\nbaseline was recorded on a different dataset: {baseline.get('dataset')}")
+    regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+    if regressions:
+        print("\nregressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--base-url", default="http://localhost:3000")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    parser.add_argument(
+        "--concurrency",
+        type=lambda value: [int(level) for level in value.split(",")],
+        default=[1, 8, 32],
+        help="comma separated number of concurrent clients, one run per level"
+    )
+    parser.add_argument("--duration", type=float, default=30, help="seconds measured per level")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds run before measuring each level")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds before a request is counted as failed")
+    parser.add_argument("--seed", type=int, default=365)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative change before flagging")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="latency changes below this are noise")
+    parser.add_argument("--output", help="also write this run's results to a JSON file")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Latency of every GET route as the number of reviews grows.
+
+For each scale the database is re-seeded with scripts/generate_fake_data.py.
+Each route is then called in-process through the ASGI app, so the numbers
+are the handler, its queries and serialization without network overhead.
+The same request (same course, professor, department) is used for every
+sample at a scale.
+
+    cold - first call after the connection pool is dropped and the response
+           cache emptied. Postgres keeps its buffers unless --cold-command
+           restarts it before each cold call, e.g.
+           "docker restart schedule-wizards && sleep 2".
+    warm - median of --repeat further calls. The response cache is emptied
+           before each call, so this times the queries, not cache hits.
+
+POST /stats/refresh is timed once per scale, after the reads.
+
+Results go to a CSV with one row per scale and route. A route is flagged as
+super-linear when, between any two consecutive scales, its warm latency grows
+faster than the review count: the slope of log(latency) over log(reviews)
+exceeds --max-exponent.
+
+    uv run python scripts/scale_sweep.py --scales 10000,100000,1000000,10000000
+"""
+from pathlib import Path
+import argparse
+import asyncio
+import csv
+import math
+import random
+import statistics
+import subprocess
+import sys
+import time
+import httpx
+import sqlalchemy
+
+# Add the project root to Python path
+root_dir = Path(__file__).parent.parent
+sys.path.append(str(root_dir))
+
+import generate_fake_data
+import load_test
+from src import config
+from src import database as db
+from src.api.server import app
+from src.cache import cache
+
+DEFAULT_OUTPUT = root_dir / "benchmarks" / "scale_sweep.csv"
+
+# routes timed at every scale, in this order
+READ_ROUTES = list(load_test.READ_WEIGHTS)
+
+# warm latencies below this are mostly fixed overhead, too noisy to compare
+MIN_FIT_MS = 1.0
+
+
+async def reset_connections() -> None:
+    await db.engine.dispose()
+    for replica in db.replicas:
+        await replica.dispose()
+    cache.clear()
+
+
+async def timed(client: httpx.AsyncClient, method: str, url: str, kwargs: dict) -> tuple[float, int]:
+    start = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    return time.perf_counter() - start, response.status_code
+
+
+async def measure(scale: int, args) -> list[dict]:
+    rows = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://sweep", timeout=None) as client:
+        fixtures = await load_test.discover(client)
+        rng = random.Random(args.seed)
+
+        for name in READ_ROUTES:
+            method, url, kwargs = load_test.ROUTES_BY_NAME[name].build(rng, fixtures)
+
+            if args.cold_command:
+                subprocess.run(args.cold_command, shell=True, check=True)
+            await reset_connections()
+            cold, status = await timed(client, method, url, kwargs)
+
+            warm = []
+            for _ in range(args.repeat):
+                cache.clear()
+                seconds, status = await timed(client, method, url, kwargs)
+                warm.append(seconds)
+
+            rows.append(row(scale, name, cold, warm, status))
+            print(f"{scale:>10} {name:<48} cold {cold * 1000:>9.1f} ms  warm {statistics.median(warm) * 1000:>9.1f} ms")
+
+        seconds, status = await timed(client, "POST", "/stats/refresh", {})
+        rows.append(row(scale, "POST /stats/refresh", seconds, [seconds], status))
+        print(f"{scale:>10} {'POST /stats/refresh':<48} {seconds * 1000:>9.1f} ms")
+
+    await reset_connections()
+    return rows
+
+
+def row(scale: int, route: str, cold: float, warm: list[float], status: int) -> dict:
+    return {
+        "reviews": scale,
+        "route": route,
+        "status": status,
+        "cold_ms": round(cold * 1000, 2),
+        "warm_ms": round(statistics.median(warm) * 1000, 2),
+        "warm_min_ms": round(min(warm) * 1000, 2),
+        "warm_max_ms": round(max(warm) * 1000, 2),
+    }
+
+
+def review_count() -> int:
+    engine = sqlalchemy.create_engine(config.get_settings().POSTGRES_URI)
+    with engine.connect() as connection:
+        count = connection.execute(sqlalchemy.text("SELECT count(*) FROM review")).scalar_one()
+    engine.dispose()
+    return count
+
+
+def growth_exponent(points: list[tuple[int, float]]) -> float | None:
+    """
+    Steepest growth between two consecutive scales, as the slope of
+    log(latency) over log(reviews): 1 is linear, 2 quadratic. A fit over all
+    scales would let the fixed overhead at the small ones hide a blowup at
+    the large ones.
+    """
+    points = [(reviews, ms) for reviews, ms in points if ms >= MIN_FIT_MS]
+    slopes = [
+        math.log(ms / previous_ms) / math.log(reviews / previous_reviews)
+        for (previous_reviews, previous_ms), (reviews, ms) in zip(points, points[1:])
+        if reviews != previous_reviews
+    ]
+    return max(slopes, default=None)
+
+
+def report(rows: list[dict], max_exponent: float) -> list[str]:
+    scales = sorted({r["reviews"] for r in rows})
+    routes = list(dict.fromkeys(r["route"] for r in rows))
+    by_key = {(r["route"], r["reviews"]): r for r in rows}
+
+    print("\nwarm latency in ms by review count")
+    print(f"{'route':<48}" + "".join(f"{scale:>12}" for scale in scales) + f"{'exponent':>10}")
+    flagged = []
+    for route in routes:
+        points = [(scale, by_key[route, scale]["warm_ms"]) for scale in scales if (route, scale) in by_key]
+        exponent = growth_exponent(points)
+        cells = "".join(
+            f"{by_key[route, scale]['warm_ms']:>12.1f}" if (route, scale) in by_key else f"{'':>12}"
+            for scale in scales
+        )
+        shown = "" if exponent is None else f"{exponent:.2f}"
+        flag = ""
+        if exponent is not None and exponent > max_exponent:
+            flag = "  SUPER-LINEAR"
+            flagged.append(route)
+        print(f"{route:<48}{cells}{shown:>10}{flag}")
+    return flagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--scales",
+        type=lambda value: [int(scale) for scale in value.split(",")],
+        default=[10_000, 100_000, 1_000_000, 10_000_000],
+        help="comma separated review counts to seed and measure"
+    )
+    parser.add_argument("--professors", type=int, default=generate_fake_data.DEFAULT_PROFESSORS)
+    parser.add_argument("--repeat", type=int, default=5, help="warm calls per route and scale")
+    parser.add_argument("--seed", type=int, default=365)
+    parser.add_argument("--cold-command", help="shell command run before every cold call, e.g. a Postgres restart")
+    parser.add_argument("--skip-seed", action="store_true", help="measure the current database as a single scale")
+    parser.add_argument("--max-exponent", type=float, default=1.1, help="flag routes whose latency grows faster than this")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    scales = [review_count()] if args.skip_seed else args.scales
+    rows = []
+    for scale in scales:
+        if not args.skip_seed:
+            print(f"\nseeding {scale} reviews")
+            start = time.perf_counter()
+            generate_fake_data.seed(scale, args.professors, args.seed)
+            print(f"seeded in {time.perf_counter() - start:.0f}s")
+        rows += asyncio.run(measure(scale, args))
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with args.output.open("w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"\nwrote {len(rows)} rows to {args.output}")
+
+    flagged = report(rows, args.max_exponent)
+    if flagged:
+        print(f"\nsuper-linear: {', '.join(flagged)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+from fastapi.responses import JSONResponse
+import pydantic_core
+
+
+def dumps(content) -> bytes:
+    """
+    Encode models, lists and dicts straight to JSON bytes with pydantic-core's
+    serializer, without the jsonable_encoder pass and json.dumps. Handlers
+    should hand it plain JSON types or models; a Decimal would come out as a
+    string.
+    """
+    return pydantic_core.to_json(content)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Default response class of the app. Handlers that build their payload from
+    trusted rows, as plain dicts shaped like the response model, return one
+    directly, which skips FastAPI validating the result a second time.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
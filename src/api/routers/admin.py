@@ -0,0 +1,73 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse, PlainTextResponse
+import time
+from src import database as db
+from src import metrics
+from src import profiling
+from src import singleflight
+from src import slow_queries
+from src.cache import cache
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+@router.get("/pool")
+async def get_pool_status():
+    """
+    Connection pool occupancy for this worker. A high wait_ms_avg or any
+    timeouts while Postgres itself is idle means requests are starved for
+    connections rather than slowed by queries.
+    """
+    now = time.monotonic()
+    return {
+        "primary": db.pool_status(db.engine),
+        "replicas": [
+            {
+                "url": replica.url.render_as_string(),
+                "healthy": db.replica_down_until[id(replica)] <= now,
+                **db.pool_status(replica)
+            }
+            for replica in db.replicas
+        ]
+    }
+
+@router.get("/cache")
+async def get_cache_stats():
+    """Response cache size, evictions and per-route hit/miss counters for this worker."""
+    return cache.stats()
+
+@router.get("/coalescing")
+async def get_coalescing_stats():
+    """Executions and requests that piggybacked on an identical in-flight one, per route."""
+    return singleflight.stats()
+
+@router.get("/queries")
+async def get_query_names():
+    """The normalized SQL behind each query name seen in db_query_* metrics."""
+    return metrics.query_names
+
+@router.get("/slow-queries")
+async def get_slow_queries(route: str | None = None, min_ms: float = 0):
+    """Most recent slow statements of this worker, newest first, with plans where sampled."""
+    return [
+        entry for entry in reversed(slow_queries.recent)
+        if (route is None or entry["route"] == route) and entry["duration_ms"] >= min_ms
+    ]
+
+@router.get("/profiles")
+async def list_profiles():
+    """Summaries of saved request profiles, newest first."""
+    return profiling.saved()
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: str = "prof", sort: profiling.SortOrder = profiling.SortOrder.cumulative):
+    """Download a saved profile as a pstats file, or read it as a text report with format=text."""
+    if not profiling.is_profile_id(profile_id):
+        raise HTTPException(status_code=400, detail="Invalid profile id")
+
+    path = profiling.profile_dir() / f"{profile_id}.prof"
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    if format == "text":
+        return PlainTextResponse(profiling.text_report(profile_id, sort))
+    return FileResponse(path, media_type="application/octet-stream", filename=path.name)
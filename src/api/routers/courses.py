@@ -2,11 +2,37 @@ from fastapi import APIRouter, Query, HTTPException
 from typing import List, Optional
 import sqlalchemy
 from src import database as db
-from src.api.routers.models import Professor, Course, CourseAggregates, CourseCreate
+from src import rollups
+from src.api.responses import FastJSONResponse
+from src.cache import cached, course_tag, professor_tag
+from src.singleflight import coalesced
+from src.api.routers.models import (
+    Professor,
+    Course,
+    CourseAggregates,
+    CourseCreate,
+    CourseTrends,
+    TermStatistics,
+    ProfessorTermStatistics,
+)
 
 
 router = APIRouter(prefix="/courses", tags=["courses"])
 
+# seconds a cached course page is served when no write invalidates it first
+COURSE_CACHE_TTL = 300
+
+# academic year order of the seasons in a term like "Winter 2025"
+TERM_SEASONS = {"Winter": 0, "Spring": 1, "Summer": 2, "Fall": 3}
+
+
+def term_sort_key(term: str):
+    """Sort terms chronologically, anything unparseable goes first."""
+    parts = term.split()
+    if len(parts) == 2 and parts[1].isdigit():
+        return (int(parts[1]), TERM_SEASONS.get(parts[0], len(TERM_SEASONS)), term)
+    return (0, 0, term)
+
 @router.get("/")
 async def list_courses(
     department: Optional[str] = None,
@@ -55,43 +81,51 @@ async def list_courses(
     elif sort_by == 'rating':
         query += f" ORDER BY c.avg_rating {order}"
         
-    with db.engine.begin() as conn:
-        result = conn.execute(
+    async with db.read_connection() as conn:
+        result = (await conn.execute(
             sqlalchemy.text(query),
             params
-        ).all()
+        )).all()
 
     if not result:
         raise HTTPException(status_code=404, detail="No courses found")
         
+    # rows come from our own tables, so the payload is built as plain dicts
+    # shaped like the response model and encoded without validating it again
     courses_dict = {}
     for row in result:
         if row.course_id not in courses_dict:
-            courses_dict[row.course_id] = Course(
-                course_id=row.course_id,
-                course_code=row.course_code,
-                name=row.name,
-                department=row.department,
-                professors=[]
-            )
+            courses_dict[row.course_id] = {
+                "course_id": row.course_id,
+                "course_code": row.course_code,
+                "name": row.name,
+                "department": row.department,
+                "professors": []
+            }
         # Only append professor if both id and name exist
         if row.prof_id is not None and row.prof_name is not None:
-            courses_dict[row.course_id].professors.append(
-                Professor(
-                    id=str(row.prof_id),
-                    name=row.prof_name,
-                    department=row.department,
-                    num_reviews=row.num_reviews
-                )
+            courses_dict[row.course_id]["professors"].append(
+                {
+                    "id": str(row.prof_id),
+                    "name": row.prof_name,
+                    "department": row.department,
+                    "num_reviews": row.num_reviews or 0,
+                    "courses": []
+                }
             )
             
-    return list(courses_dict.values())
+    return FastJSONResponse(list(courses_dict.values()))
 
 @router.get("/{course_code}")
+@cached(
+    "course",
+    ttl=COURSE_CACHE_TTL,
+    tags=lambda course, **_: [course_tag(course["course_code"])] + [professor_tag(p["id"]) for p in course["professors"]]
+)
 async def get_course(course_code: str) -> Course:
     """Get a specific course's details by name."""
-    with db.engine.begin() as conn:
-        result = conn.execute(
+    async with db.read_connection() as conn:
+        result = (await conn.execute(
             sqlalchemy.text(
                 """
                 SELECT
@@ -111,7 +145,7 @@ async def get_course(course_code: str) -> Course:
                 """
             ),
             {"course_code": course_code.upper()}
-        ).all()
+        )).all()
 
         if not result:
             raise HTTPException(status_code=404, detail="Course not found")
@@ -119,21 +153,22 @@ async def get_course(course_code: str) -> Course:
         courses_dict = {}
         for row in result:
             if row.course_id not in courses_dict:
-                courses_dict[row.course_id] = Course(
-                    course_id=row.course_id,
-                    course_code=row.course_code,
-                    name=row.name,
-                    department=row.department,
-                    professors=[]
-                )
+                courses_dict[row.course_id] = {
+                    "course_id": row.course_id,
+                    "course_code": row.course_code,
+                    "name": row.name,
+                    "department": row.department,
+                    "professors": []
+                }
             if row.prof_id is not None and row.prof_name is not None:
-                courses_dict[row.course_id].professors.append(
-                    Professor(
-                        id=str(row.prof_id),
-                        name=row.prof_name,
-                        department=row.department,
-                        num_reviews=row.total_reviews or 0
-                    )
+                courses_dict[row.course_id]["professors"].append(
+                    {
+                        "id": str(row.prof_id),
+                        "name": row.prof_name,
+                        "department": row.department,
+                        "num_reviews": row.total_reviews or 0,
+                        "courses": []
+                    }
                 )
  
         if len(courses_dict) != 1:
@@ -148,20 +183,15 @@ async def get_course(course_code: str) -> Course:
 @router.get("/{course_code}/professors")
 async def get_course_professors(course_code: str) -> List[Professor]:
     """Get professors teaching a specific course by its code (e.g., 'ME101', 'CSC101')."""
-    with db.engine.begin() as connection:
-        result = connection.execute(
+    async with db.read_connection() as connection:
+        result = (await connection.execute(
             sqlalchemy.text(
                 """
                 SELECT 
                     p.id as prof_id,
                     p.name as prof_name,
                     d.abbrev as department,
-                    (
-                        SELECT COUNT(*)
-                        FROM review r
-                        JOIN professors_courses pc2 ON r.course_id = pc2.course_id
-                        WHERE pc2.professor_id = p.id
-                    ) as num_reviews
+                    p.total_reviews as num_reviews
                 FROM course c
                 JOIN department_courses dc ON c.id = dc.course_id
                 JOIN department d ON dc.department_id = d.id
@@ -171,7 +201,7 @@ async def get_course_professors(course_code: str) -> List[Professor]:
                 """
             ),
             {"course_code": course_code.upper()}
-        ).all()
+        )).all()
         
     if not result:
         raise HTTPException(status_code=404, detail=f"Course {course_code} not found")
@@ -180,69 +210,147 @@ async def get_course_professors(course_code: str) -> List[Professor]:
     for row in result:
         if row.prof_id is not None:
             professors.append(
-                Professor(
-                    id=str(row.prof_id),
-                    name=row.prof_name,
-                    department=row.department,
-                    num_reviews=row.num_reviews or 0,
-                    courses=[] 
-                )
+                {
+                    "id": str(row.prof_id),
+                    "name": row.prof_name,
+                    "department": row.department,
+                    "num_reviews": row.num_reviews or 0,
+                    "courses": []
+                }
             )
             
-    return professors
+    return FastJSONResponse(professors)
 
 @router.get("/{course_code}/statistics")
+@cached("course_statistics", ttl=COURSE_CACHE_TTL, tags=lambda _, course_code: [course_tag(course_code)])
 async def get_course_aggregates(course_code: str) -> CourseAggregates:
     """Get aggregated statistics for a course by its code (e.g., 'ME101', 'CSC101')."""
-    with db.engine.begin() as connection:
-        # first get the course_id from the course_code
-        course = connection.execute(
+    async with db.read_connection() as connection:
+        # averages are derived from the running counters kept by create_review
+        course = (await connection.execute(
             sqlalchemy.text(
                 """
-                SELECT id 
+                SELECT 
+                    review_count,
+                    rating_sum,
+                    difficulty_sum,
+                    workload_sum
                 FROM course 
                 WHERE course_code = :course_code
                 """
             ),
             {"course_code": course_code.upper()}
-        ).first()
+        )).first()
 
-        if not course:
-            raise HTTPException(status_code=404, detail=f"Course {course_code} not found")
+    if not course:
+        raise HTTPException(status_code=404, detail=f"Course {course_code} not found")
+
+    if not course.review_count:
+        return CourseAggregates(
+            average_rating=0,
+            average_difficulty=0,
+            average_workload=0,
+            total_reviews=0,
+        )
+
+    return CourseAggregates(
+        average_rating=round(course.rating_sum / course.review_count, 1),
+        average_difficulty=round(course.difficulty_sum / course.review_count, 1),
+        average_workload=round(course.workload_sum / course.review_count, 1),
+        total_reviews=course.review_count,
+    )
 
-        result = connection.execute(
+@router.get("/{course_code}/trends")
+@coalesced("course_trends")
+async def get_course_trends(course_code: str, professor_id: Optional[int] = None) -> CourseTrends:
+    """
+    Get per-term statistics for a course, broken down by professor. Pass
+    professor_id to only get the series of one instructor.
+    """
+    async with db.read_connection() as connection:
+        course = (await connection.execute(
             sqlalchemy.text(
                 """
-                SELECT 
-                    AVG(r.overall_rating) as avg_rating,
-                    AVG(r.difficulty) as avg_difficulty,
-                    AVG(r.workload_rating) as avg_workload,
-                    COUNT(r.id) as total_reviews
-                FROM review r
-                WHERE r.course_id = :course_id
+                SELECT id, course_code
+                FROM course 
+                WHERE course_code = :course_code
                 """
             ),
-            {"course_id": course.id}
-        ).first()
-    
-        
-    return CourseAggregates(
-        average_rating=round(result.avg_rating or 0, 1),
-        average_difficulty=round(result.avg_difficulty or 0, 1),
-        average_workload=round(result.avg_workload or 0, 1),
-        total_reviews=result.total_reviews or 0,
-    )
+            {"course_code": course_code.upper()}
+        )).first()
+
+        if not course:
+            raise HTTPException(status_code=404, detail=f"Course {course_code} not found")
+
+        query = """
+        SELECT
+            cts.term,
+            cts.professor_id,
+            p.name AS professor_name,
+            cts.review_count,
+            cts.rating_sum,
+            cts.difficulty_sum,
+            cts.workload_sum
+        FROM course_term_stats cts
+        LEFT JOIN professor p ON p.id = cts.professor_id
+        WHERE cts.course_id = :course_id
+        """
+        params = {"course_id": course.id}
+        if professor_id is not None:
+            query += " AND cts.professor_id = :professor_id"
+            params["professor_id"] = professor_id
+
+        rows = (await connection.execute(sqlalchemy.text(query), params)).all()
+
+    terms = {}
+    for row in rows:
+        if row.term not in terms:
+            terms[row.term] = {"review_count": 0, "rating_sum": 0, "difficulty_sum": 0, "workload_sum": 0, "professors": []}
+        totals = terms[row.term]
+        totals["review_count"] += row.review_count
+        totals["rating_sum"] += row.rating_sum
+        totals["difficulty_sum"] += row.difficulty_sum
+        totals["workload_sum"] += row.workload_sum
+        if row.review_count:
+            totals["professors"].append(
+                ProfessorTermStatistics(
+                    professor_id=row.professor_id,
+                    professor_name=row.professor_name,
+                    total_reviews=row.review_count,
+                    average_rating=round(row.rating_sum / row.review_count, 1),
+                    average_difficulty=round(row.difficulty_sum / row.review_count, 1),
+                    average_workload=round(row.workload_sum / row.review_count, 1),
+                )
+            )
+
+    series = []
+    for term in sorted(terms, key=term_sort_key):
+        totals = terms[term]
+        if not totals["review_count"]:
+            continue
+        series.append(
+            TermStatistics(
+                term=term,
+                total_reviews=totals["review_count"],
+                average_rating=round(totals["rating_sum"] / totals["review_count"], 1),
+                average_difficulty=round(totals["difficulty_sum"] / totals["review_count"], 1),
+                average_workload=round(totals["workload_sum"] / totals["review_count"], 1),
+                professors=totals["professors"],
+            )
+        )
+
+    return CourseTrends(course_code=course.course_code, terms=series)
 
 @router.post("/", status_code=201, response_model=Course)
 async def create_course(course: CourseCreate):
-    with db.engine.begin() as connection:
+    async with db.engine.begin() as connection:
         try:
-            dept = connection.execute(
+            dept = (await connection.execute(
                 sqlalchemy.text(
                     "SELECT id FROM department WHERE abbrev = :dept"
                 ),
                 {"dept": course.department}
-            ).first()
+            )).first()
             
             if not dept:
                 raise HTTPException(
@@ -250,7 +358,7 @@ async def create_course(course: CourseCreate):
                     detail=f"Department {course.department} does not exist"
                 )
             
-            course_exists = connection.execute(
+            course_exists = (await connection.execute(
                 sqlalchemy.text(
                     """
                     SELECT id
@@ -259,7 +367,7 @@ async def create_course(course: CourseCreate):
                     """
                 ),
                 {"course_code": course.course_code}
-            ).first()
+            )).first()
 
             if course_exists:
                 raise HTTPException(
@@ -268,7 +376,7 @@ async def create_course(course: CourseCreate):
                 )
                 
             # create course
-            course_id = connection.execute(
+            course_id = (await connection.execute(
                 sqlalchemy.text(
                     """
                     INSERT INTO course (course_code, name)
@@ -280,10 +388,10 @@ async def create_course(course: CourseCreate):
                     "course_code": course.course_code.upper(),
                     "name": course.name,
                 }
-            ).scalar_one()
+            )).scalar_one()
             
             # link course to department
-            connection.execute(
+            await connection.execute(
                 sqlalchemy.text(
                     """
                     INSERT INTO department_courses (department_id, course_id)
@@ -295,6 +403,7 @@ async def create_course(course: CourseCreate):
                     "course_id": course_id
                 }
             )
+            await rollups.add_course(connection, dept.id)
             
             return Course(
                 course_id=course_id,
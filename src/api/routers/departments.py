@@ -1,15 +1,21 @@
 from fastapi import APIRouter, HTTPException
 import sqlalchemy
 from src import database as db
+from src import rollups
+from src.cache import DEPARTMENTS_TAG, cache, cached, publish
+from src.singleflight import coalesced
 from src.api.routers.models import DepartmentCreate, Department, DepartmentStatistics
 from typing import Any, Dict
 router = APIRouter(prefix="/departments", tags=["departments"])
 
+# seconds a cached department listing is served, departments rarely change
+DEPARTMENTS_CACHE_TTL = 3600
+
 @router.post("/")
 async def create_department(department: DepartmentCreate):
     """Create a new department."""
-    with db.engine.begin() as connection:
-        existing_school = connection.execute(
+    async with db.engine.begin() as connection:
+        existing_school = (await connection.execute(
             sqlalchemy.text(
                 """
                 SELECT 1
@@ -18,7 +24,7 @@ async def create_department(department: DepartmentCreate):
                 """
             ),
             {"id": department.school_id}
-        ).first()
+        )).first()
 
         if existing_school is None:
             raise HTTPException(
@@ -27,7 +33,7 @@ async def create_department(department: DepartmentCreate):
             )
         
         try:
-            result = connection.execute(
+            result = await connection.execute(
                 sqlalchemy.text(
                     """
                     INSERT INTO department
@@ -43,19 +49,24 @@ async def create_department(department: DepartmentCreate):
                 }
             )
             department_id = result.scalar_one()
-            return {"id": str(department_id), "message": "Department created successfully"}
+            await rollups.add_department(connection, department_id)
+            await publish(connection, [DEPARTMENTS_TAG])
         except sqlalchemy.exc.IntegrityError as e:
             raise HTTPException(
             status_code=409,
             detail="Department already exists"
             ) from e
 
+    cache.invalidate([DEPARTMENTS_TAG], await db.current_lsn())
+    return {"id": str(department_id), "message": "Department created successfully"}
+
 @router.get("/")
+@cached("departments", ttl=DEPARTMENTS_CACHE_TTL, tags=lambda _, **params: [DEPARTMENTS_TAG])
 async def list_departments(limit: int = 10, offset: int = 0) -> Dict[str, Any]:
     """List all departments at a school."""
-    with db.engine.begin() as connection:
+    async with db.read_connection() as connection:
         
-        departments = connection.execute(
+        departments = (await connection.execute(
             sqlalchemy.text(
                 """
                 SELECT id, name, abbrev, school_id
@@ -68,13 +79,13 @@ async def list_departments(limit: int = 10, offset: int = 0) -> Dict[str, Any]:
                 "limit": limit,
                 "offset": offset
             }
-        ).all()
+        )).all()
 
-        total_result = connection.execute(
+        total_result = (await connection.execute(
             sqlalchemy.text(
                 "SELECT COUNT(*) FROM department"
             )
-        ).scalar_one()
+        )).scalar_one()
         
         departments_list = []
 
@@ -83,7 +94,7 @@ async def list_departments(limit: int = 10, offset: int = 0) -> Dict[str, Any]:
             Name = row.name
             Abbreviation = row.abbrev
             School_id = row.school_id
-            departments_list.append(Department(department_id = Id, name = Name, abbrev=Abbreviation, school_id = School_id))
+            departments_list.append({"department_id": Id, "name": Name, "abbrev": Abbreviation, "school_id": School_id})
 
         return {
             "total": total_result,
@@ -91,94 +102,64 @@ async def list_departments(limit: int = 10, offset: int = 0) -> Dict[str, Any]:
         }
 
 @router.get("/{department_abbrev}/statistics", response_model=DepartmentStatistics)
+@coalesced("department_statistics")
 async def get_department_statistics(department_abbrev: str):
     """
     Get comprehensive statistics for a department including course and professor counts,
     average ratings, and commonly used tags in reviews.
     """
-    with db.engine.begin() as connection:
-        # first get department info and basic stats
-        dept_result = connection.execute(
+    async with db.read_connection() as connection:
+        # department_stats is kept current by review writes and course assignments
+        dept_result = (await connection.execute(
             sqlalchemy.text(
                 """
-                WITH DeptStats AS (
-                    SELECT 
-                        d.id,
-                        d.name,
-                        d.abbrev,
-                        d.school_id,
-                        COUNT(DISTINCT c.id) as total_courses,
-                        COUNT(DISTINCT p.id) as total_professors,
-                        COUNT(DISTINCT r.id) as total_reviews,
-                        ROUND(AVG(r.difficulty), 1) as avg_difficulty,
-                        ROUND(AVG(r.workload_rating), 1) as avg_workload,
-                        ROUND(AVG(r.overall_rating), 1) as avg_rating
-                    FROM department d
-                    LEFT JOIN department_courses dc ON d.id = dc.department_id
-                    LEFT JOIN course c ON dc.course_id = c.id
-                    LEFT JOIN professors_courses pc ON c.id = pc.course_id
-                    LEFT JOIN professor p ON pc.professor_id = p.id
-                    LEFT JOIN review r ON r.course_id = c.id
-                    WHERE d.abbrev = :dept_abbrev
-                    GROUP BY d.id, d.name, d.abbrev, d.school_id
-                )
                 SELECT 
-                    ds.*,
-                    array_agg(DISTINCT t.name) FILTER (WHERE t.name IS NOT NULL) as common_tags
-                FROM DeptStats ds
-                LEFT JOIN department_courses dc ON ds.id = dc.department_id
-                LEFT JOIN course c ON dc.course_id = c.id
-                LEFT JOIN review r ON r.course_id = c.id
-                LEFT JOIN review_tags rt ON r.id = rt.review_id
-                LEFT JOIN tag t ON rt.tag_id = t.id
-                GROUP BY ds.id, ds.name, ds.abbrev, ds.school_id, ds.total_courses, 
-                         ds.total_professors, ds.total_reviews, ds.avg_difficulty, 
-                         ds.avg_workload, ds.avg_rating
-                """
-            ),
-            {"dept_abbrev": department_abbrev.upper()}
-        ).first()
-
-        if not dept_result:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Department with abbreviation '{department_abbrev}' not found"
-            )
-
-        # get most common tags
-        tags_result = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT t.name, COUNT(*) as tag_count
+                    d.id,
+                    d.name,
+                    d.abbrev,
+                    d.school_id,
+                    ds.total_courses,
+                    ds.total_professors,
+                    ds.total_reviews,
+                    ds.rating_sum,
+                    ds.difficulty_sum,
+                    ds.workload_sum,
+                    ds.top_tags
                 FROM department d
-                JOIN department_courses dc ON d.id = dc.department_id
-                JOIN course c ON dc.course_id = c.id
-                JOIN review r ON r.course_id = c.id
-                JOIN review_tags rt ON r.id = rt.review_id
-                JOIN tag t ON rt.tag_id = t.id
+                LEFT JOIN department_stats ds ON ds.department_id = d.id
                 WHERE d.abbrev = :dept_abbrev
-                GROUP BY t.name
-                ORDER BY tag_count DESC
-                LIMIT 10
                 """
             ),
             {"dept_abbrev": department_abbrev.upper()}
-        ).all()
+        )).first()
 
-        department = Department(
-            department_id=dept_result.id,
-            name=dept_result.name,
-            abbrev=dept_result.abbrev,
-            school_id=dept_result.school_id
+    if not dept_result:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Department with abbreviation '{department_abbrev}' not found"
         )
 
-        return DepartmentStatistics(
-            department=department,
-            total_courses=dept_result.total_courses or 0,
-            total_professors=dept_result.total_professors or 0,
-            average_difficulty=float(dept_result.avg_difficulty or 0),
-            average_workload=float(dept_result.avg_workload or 0),
-            average_rating=float(dept_result.avg_rating or 0),
-            total_reviews=dept_result.total_reviews or 0,
-            most_common_tags=[tag.name for tag in tags_result]
-        )
+    department = Department(
+        department_id=dept_result.id,
+        name=dept_result.name,
+        abbrev=dept_result.abbrev,
+        school_id=dept_result.school_id
+    )
+
+    total_reviews = dept_result.total_reviews or 0
+    average_difficulty = average_workload = average_rating = 0.0
+    if total_reviews:
+        average_difficulty = round(dept_result.difficulty_sum / total_reviews, 1)
+        average_workload = round(dept_result.workload_sum / total_reviews, 1)
+        average_rating = round(dept_result.rating_sum / total_reviews, 1)
+
+    return DepartmentStatistics(
+        department=department,
+        total_courses=dept_result.total_courses or 0,
+        total_professors=dept_result.total_professors or 0,
+        average_difficulty=average_difficulty,
+        average_workload=average_workload,
+        average_rating=average_rating,
+        total_reviews=total_reviews,
+        most_common_tags=dept_result.top_tags or []
+    )
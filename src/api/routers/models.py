@@ -120,6 +120,29 @@ class CourseAggregates(BaseModel):
     average_workload: float = Field(ge=0, le=168)
     total_reviews: int = Field(ge=0)
 
+class ProfessorTermStatistics(BaseModel):
+    professor_id: int | None = Field(
+        default=None,
+        description="None for older reviews that could not be attributed to a professor"
+    )
+    professor_name: str | None = None
+    total_reviews: int = Field(ge=0)
+    average_rating: float = Field(ge=0, le=5)
+    average_difficulty: float = Field(ge=0, le=5)
+    average_workload: float = Field(ge=0, le=168)
+
+class TermStatistics(BaseModel):
+    term: str = Field(min_length=3, max_length=20, example="Spring 2025")
+    total_reviews: int = Field(ge=0)
+    average_rating: float = Field(ge=0, le=5)
+    average_difficulty: float = Field(ge=0, le=5)
+    average_workload: float = Field(ge=0, le=168)
+    professors: List[ProfessorTermStatistics] = []
+
+class CourseTrends(BaseModel):
+    course_code: str = Field(min_length=5, max_length=10, example="CSC365")
+    terms: List[TermStatistics] = Field(description="One entry per term, oldest first")
+
 class CourseCreate(BaseModel):
     course_code: str = Field(
         min_length=5, 
@@ -2,18 +2,27 @@ from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 from typing import List
 import sqlalchemy
-from src.api.routers.models import Professor, Review, ProfessorDetails, NewProfessor
+from src.api.routers.models import Professor, ProfessorDetails, NewProfessor
 from src import database as db
+from src import rollups
+from src.api.responses import FastJSONResponse
+from src.cache import cache, cached, course_tag, professor_tag, publish
+from src.singleflight import coalesced
 
 router = APIRouter(prefix="/professors", tags=["professors"])
 
+# seconds a cached professor page is served when no write invalidates it first
+PROFESSOR_CACHE_TTL = 300
+
 # TODO: allow metadata to be attaching courses to professor
 # TODO: add endpoint for attaching courses to a professor
 @router.get("/{professor_id}")
+@cached("professor", ttl=PROFESSOR_CACHE_TTL, tags=lambda _, professor_id: [professor_tag(professor_id)])
+@coalesced("professor")
 async def get_professor_details(professor_id: int) -> ProfessorDetails:
     """Get detailed information about a professor including their reviews and courses."""
-    with db.engine.begin() as connection:
-        prof_result = connection.execute(
+    async with db.read_connection() as connection:
+        prof_result = (await connection.execute(
             sqlalchemy.text(
                 """
                 SELECT 
@@ -29,36 +38,28 @@ async def get_professor_details(professor_id: int) -> ProfessorDetails:
                 WHERE p.id = :prof_id
                 """
             ), {"prof_id": professor_id}
-        ).first()
+        )).first()
         if not prof_result:
             raise HTTPException(status_code=404, detail=f"Professor with id '{professor_id}' not found")
 
         # fetch all courses for this professor
-        courses_result = connection.execute(
+        courses_result = (await connection.execute(
             sqlalchemy.text(
                 """
                 SELECT
-                    r.id as review_id,
                     c.id as course_id,
                     c.course_code,
                     c.name as course_name,
-                    d.abbrev as department,
-                    r.term,
-                    r.difficulty,
-                    r.overall_rating,
-                    r.workload_rating,
-                    r.comments
-                FROM review r
-                JOIN course c ON r.course_id = c.id
-                JOIN professors_courses pc ON c.id = pc.course_id
-                JOIN professor p ON pc.professor_id = p.id
+                    d.abbrev as department
+                FROM professors_courses pc
+                JOIN course c ON pc.course_id = c.id
                 JOIN department d ON c.department_id = d.id
-                WHERE p.id = :prof_id
+                WHERE pc.professor_id = :prof_id
                 """
             ), {"prof_id": professor_id}
-        ).all()
+        )).all()
 
-        reviews_result = connection.execute(
+        reviews_result = (await connection.execute(
             sqlalchemy.text(
                 """
                 SELECT
@@ -76,49 +77,35 @@ async def get_professor_details(professor_id: int) -> ProfessorDetails:
                     FROM review r
                     JOIN course c ON r.course_id = c.id
                     JOIN department d ON c.department_id = d.id
-                    JOIN professors_courses pc ON pc.course_id = c.id
-                    JOIN professor p ON p.id = pc.professor_id
                     LEFT JOIN review_tags ON r.id = review_tags.review_id
                     LEFT JOIN tag ON review_tags.tag_id = tag.id
-                    WHERE pc.professor_id = :prof_id
+                    WHERE r.professor_id = :prof_id
                 """
             ), {"prof_id": professor_id}
-        ).all()
+        )).all()
 
         
-        tags_result = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT t.name AS tag_name, COUNT(*) AS count
-                FROM professor p
-                JOIN professors_courses pc ON p.id = pc.professor_id
-                JOIN review r ON r.course_id = pc.course_id
-                JOIN review_tags rt ON rt.review_id = r.id
-                JOIN tag t ON rt.tag_id = t.id
-                WHERE p.id = :prof_id
-                GROUP BY t.name
-                ORDER BY count DESC
-                LIMIT 10
-                """
-            ), {"prof_id": professor_id})
+        tags = await rollups.top_tags(connection, "professor", professor_id)
         
+        # built as plain dicts shaped like ProfessorDetails, the rows are our own
+        # and re-validating every review costs more than the queries
         courses = [
             {
                 "course_id": int(row.course_id), 
                 "course_code": row.course_code,
                 "name": row.course_name,
                 "department": row.department,
+                "professors": []
             } for row in courses_result
         ]
-        print(courses)
 
-        professor = Professor(
-            id=str(prof_result.id),
-            name=prof_result.name,
-            department=prof_result.department,
-            num_reviews=prof_result.total_reviews or 0,
-            courses=courses
-        )
+        professor = {
+            "id": str(prof_result.id),
+            "name": prof_result.name,
+            "department": prof_result.department,
+            "num_reviews": prof_result.total_reviews or 0,
+            "courses": courses
+        }
         
 
 
@@ -133,53 +120,52 @@ async def get_professor_details(professor_id: int) -> ProfessorDetails:
                     "course_code": row.course_code,
                     "name": row.course_name,
                     "department": row.department,
+                    "professors": []
                 }
 
-                review_map[review_id] = Review(
-                    review_id=str(review_id),
-                    course=course,
-                    term=row.term,
-                    difficulty_rating=row.difficulty,
-                    overall_rating=row.overall_rating,
-                    workload_estimate=row.workload_rating,
-                    tags=[],
-                    comments=row.comments,
-                )
+                review_map[review_id] = {
+                    "review_id": review_id,
+                    "course": course,
+                    "term": row.term,
+                    "difficulty_rating": row.difficulty,
+                    "overall_rating": row.overall_rating,
+                    "workload_estimate": row.workload_rating,
+                    "tags": [],
+                    "comments": row.comments
+                }
 
             tag_name = row.tag_name
-            if tag_name and tag_name not in review_map[review_id].tags:
-                review_map[review_id].tags.append(tag_name)
+            if tag_name and tag_name not in review_map[review_id]["tags"]:
+                review_map[review_id]["tags"].append(tag_name)
 
         reviews = list(review_map.values())
 
-        tags = [row.tag_name for row in tags_result]
-
-        return ProfessorDetails(
-            professor=professor,
-            reviews=reviews,
-            average_difficulty=float(prof_result.avg_difficulty or 0),
-            average_workload=float(prof_result.avg_workload or 0),
-            average_rating=float(prof_result.avg_rating or 0),
-            most_common_tags=tags
-        )
+        return {
+            "professor": professor,
+            "reviews": reviews,
+            "average_difficulty": float(prof_result.avg_difficulty or 0),
+            "average_workload": float(prof_result.avg_workload or 0),
+            "average_rating": float(prof_result.avg_rating or 0),
+            "most_common_tags": tags
+        }
 
 @router.post("/")
 async def create_professor(professor: NewProfessor):
     """Create a new professor using apartment abbreviation."""
     # first check if department exists
     try:    
-        with db.engine.begin() as connection:
-            dept_id = connection.execute(
+        async with db.engine.begin() as connection:
+            dept_id = (await connection.execute(
                 sqlalchemy.text(
                     """
                     SELECT id FROM department WHERE abbrev = :dept
                     """    
-                ), {'dept': professor.department}).scalar()
+                ), {'dept': professor.department})).scalar()
             
             if not dept_id:
                 raise HTTPException(status_code=404, detail="Invalid department")
             
-            prof_exists = connection.execute(
+            prof_exists = (await connection.execute(
                 sqlalchemy.text(
                     """
                     SELECT 1
@@ -189,7 +175,7 @@ async def create_professor(professor: NewProfessor):
                 ),
                 {"dept_id": dept_id,
                  "name": professor.name}
-            ).first()
+            )).first()
 
             if prof_exists:
                 raise HTTPException(
@@ -197,7 +183,7 @@ async def create_professor(professor: NewProfessor):
                     detail=f"Professor {professor.name} in department {professor.department} already exists"
                 )
 
-            new_id = connection.execute(
+            new_id = (await connection.execute(
                 sqlalchemy.text(
                     """
                     INSERT INTO professor (name, department_id, total_reviews) 
@@ -209,7 +195,7 @@ async def create_professor(professor: NewProfessor):
                     'name': professor.name,
                     'dept_id': dept_id
                 }
-            ).scalar()
+            )).scalar()
             
             return {"id": str(new_id), "message": "Professor created successfully"}
     except sqlalchemy.exc.IntegrityError as e:
@@ -223,14 +209,14 @@ async def attach_courses_to_professor(
     course_codes: List[str]
 ) -> dict:
     """Attach courses to a professor by id. Course codes should be in the format 'ME101', 'CSC101', etc."""
-    with db.engine.begin() as connection:
+    async with db.engine.begin() as connection:
         # first verify the professor exists
-        professor = connection.execute(
+        professor = (await connection.execute(
             sqlalchemy.text(
                 "SELECT 1 FROM professor WHERE id = :prof_id"
             ),
             {"prof_id": professor_id}
-        ).first()
+        )).first()
         
         if not professor:
             raise HTTPException(
@@ -239,12 +225,12 @@ async def attach_courses_to_professor(
             )
         
         # verify all courses exist and get their IDs
-        courses = connection.execute(
+        courses = (await connection.execute(
             sqlalchemy.text(
                 "SELECT id, course_code FROM course WHERE course_code = ANY(:course_codes)"
             ),
             {"course_codes": course_codes}
-        ).all()
+        )).all()
         
         if len(courses) != len(course_codes):
             raise HTTPException(
@@ -253,9 +239,10 @@ async def attach_courses_to_professor(
             )
             
         # add the associations
+        attached_course_ids = []
         for course in courses:
             try:
-                course_is_attached = connection.execute(
+                course_is_attached = (await connection.execute(
                     sqlalchemy.text(
                         """
                         SELECT 1 
@@ -268,13 +255,13 @@ async def attach_courses_to_professor(
                         "prof_id": professor_id,
                         "course_id": course.id
                     }
-                ).first()
+                )).first()
 
                 if course_is_attached:
                     print(f"Course {course.course_code} is already attached to professor {professor_id}, skipping...")
                     continue
 
-                connection.execute(
+                await connection.execute(
                     sqlalchemy.text(
                         """
                         INSERT INTO professors_courses (professor_id, course_id)
@@ -286,11 +273,21 @@ async def attach_courses_to_professor(
                         "course_id": course.id
                     }
                 )
+                attached_course_ids.append(course.id)
             except sqlalchemy.exc.IntegrityError:
                 print(f"Failed to attach course {course.course_code} to professor with id {professor_id}")
                 continue
 
-        return {"message": f"Finished processing {len(course_codes)} courses for professor with id '{professor_id}'"}
+        await rollups.apply_assignments(connection, attached_course_ids)
+
+        # course pages list their professors
+        touched = [professor_tag(professor_id)] + [
+            course_tag(course.course_code) for course in courses if course.id in attached_course_ids
+        ]
+        await publish(connection, touched)
+
+    cache.invalidate(touched, await db.current_lsn())
+    return {"message": f"Finished processing {len(course_codes)} courses for professor with id '{professor_id}'"}
 
 @router.get("/search/by-tags")
 async def search_professors_by_tags(tags: List[str] = Query(None, description="List of tags to search for")) -> List[Professor]:
@@ -301,43 +298,40 @@ async def search_professors_by_tags(tags: List[str] = Query(None, description="L
     if not tags:
         raise HTTPException(status_code=400, detail="At least one tag must be provided")
         
-    with db.engine.begin() as connection:
-        result = connection.execute(
+    async with db.read_connection() as connection:
+        result = (await connection.execute(
             sqlalchemy.text(
                 """
                 WITH tag_matches AS (
                     SELECT 
-                        p.id,
-                        p.name,
-                        d.abbrev as department,
-                        COUNT(DISTINCT t.name) as matching_tags,
-                        COUNT(*) as tag_frequency,
-                        p.total_reviews
-                    FROM professor p
-                    JOIN department d ON p.department_id = d.id
-                    JOIN professors_courses pc ON p.id = pc.professor_id
-                    JOIN review r ON r.course_id = pc.course_id
-                    JOIN review_tags rt ON r.id = rt.review_id
-                    JOIN tag t ON rt.tag_id = t.id
+                        ptc.professor_id,
+                        COUNT(*) as matching_tags,
+                        SUM(ptc.tag_count) as tag_frequency,
+                        array_agg(t.name ORDER BY t.name) as matched_tags
+                    FROM tag t
+                    JOIN professor_tag_counts ptc ON ptc.tag_id = t.id
                     WHERE t.name = ANY(:tags)
-                    GROUP BY p.id, p.name, d.abbrev, p.total_reviews
+                    AND ptc.tag_count > 0
+                    GROUP BY ptc.professor_id
                     ORDER BY matching_tags DESC, tag_frequency DESC
                     LIMIT 20
                 )
                 SELECT 
-                    tm.*,
-                    array_agg(DISTINCT t.name) as matched_tags
+                    p.id,
+                    p.name,
+                    d.abbrev as department,
+                    p.total_reviews,
+                    tm.matching_tags,
+                    tm.tag_frequency,
+                    tm.matched_tags
                 FROM tag_matches tm
-                JOIN professors_courses pc ON tm.id = pc.professor_id
-                JOIN review r ON r.course_id = pc.course_id
-                JOIN review_tags rt ON r.id = rt.review_id
-                JOIN tag t ON rt.tag_id = t.id
-                WHERE t.name = ANY(:tags)
-                GROUP BY tm.id, tm.name, tm.department, tm.matching_tags, tm.tag_frequency, tm.total_reviews
+                JOIN professor p ON p.id = tm.professor_id
+                JOIN department d ON p.department_id = d.id
+                ORDER BY tm.matching_tags DESC, tm.tag_frequency DESC
                 """
             ),
             {"tags": tags}
-        ).all()
+        )).all()
         
         if not result:
             return []
@@ -345,13 +339,13 @@ async def search_professors_by_tags(tags: List[str] = Query(None, description="L
         professors = []
         for row in result:
             professors.append(
-                Professor(
-                    id=str(row.id),
-                    name=row.name,
-                    department=row.department,
-                    num_reviews=row.total_reviews or 0,
-                    courses=[] 
-                )
+                {
+                    "id": str(row.id),
+                    "name": row.name,
+                    "department": row.department,
+                    "num_reviews": row.total_reviews or 0,
+                    "courses": []
+                }
             )
             
-        return professors
+        return FastJSONResponse(professors)
@@ -1,16 +1,65 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from typing import Optional
+import base64
+import csv
+import io
+import json
+import math
 import sqlalchemy
 from src.api.routers.models import ReviewCreate
+from src import config
 from src import database as db
+from src import rollups
+from src.api.responses import FastJSONResponse
+from src.cache import cache, course_tag, professor_tag, publish
 
 router = APIRouter(prefix="/reviews", tags=["reviews"])
 
+# upper bound on items accepted by one POST /reviews/bulk call
+MAX_BULK_REVIEWS = 100000
+
+# largest page a review listing will return
+MAX_PAGE_SIZE = 200
+
+# rows fetched from the server-side cursor per round trip while exporting
+EXPORT_CHUNK_SIZE = 5000
+
+EXPORT_COLUMNS = [
+    "review_id",
+    "course_code",
+    "course_name",
+    "professor_id",
+    "term",
+    "difficulty_rating",
+    "overall_rating",
+    "workload_estimate",
+    "comments",
+    "tags",
+]
+
+def pin_reads(response: Response, lsn: str | None) -> None:
+    """
+    Hand the client the primary's WAL position after a committed write. While
+    the cookie lives, its reads only use a replica that has replayed it.
+    """
+    if lsn is not None:
+        response.set_cookie(
+            db.LSN_COOKIE,
+            lsn,
+            max_age=config.get_settings().READ_YOUR_WRITES_SECONDS,
+            httponly=True
+        )
+        response.headers["X-Min-LSN"] = lsn
+
 @router.post("/")
-async def create_review(review: ReviewCreate):
+async def create_review(review: ReviewCreate, response: Response):
     """Create a new review."""
-    with db.engine.begin() as connection:
+    touched = [course_tag(review.course_code), professor_tag(review.professor_id)]
+    async with db.engine.begin() as connection:
         # First get the course and professor IDs from their names/codes
-        course_and_prof = connection.execute(
+        course_and_prof = (await connection.execute(
             sqlalchemy.text(
                 """
                 SELECT c.id as course_id, p.id as prof_id
@@ -25,7 +74,7 @@ async def create_review(review: ReviewCreate):
                 "course_code": review.course_code,
                 "professor_id": review.professor_id
             }
-        ).first()
+        )).first()
 
         if not course_and_prof:
             raise HTTPException(
@@ -34,29 +83,30 @@ async def create_review(review: ReviewCreate):
             )
             
         try:
-            review_id = connection.execute(
+            review_id = (await connection.execute(
                 sqlalchemy.text(
                     """
                     INSERT INTO review 
-                    (course_id, term, difficulty, overall_rating, 
+                    (course_id, professor_id, term, difficulty, overall_rating, 
                     workload_rating, comments)
                     VALUES 
-                    (:course_id, :term, :difficulty, :rating, 
+                    (:course_id, :professor_id, :term, :difficulty, :rating, 
                     :workload, :comments)
                     RETURNING id
                     """    
             ), {
                 'course_id': course_and_prof.course_id,
+                'professor_id': course_and_prof.prof_id,
                 'term': review.term,
                 'difficulty': review.difficulty_rating,
                 'rating': review.overall_rating,
                 'workload': review.workload_estimate,
                 'comments': review.comments
-            }).scalar_one()
+            })).scalar_one()
             
             for tag in review.tags:
                 # get or create tag
-                tag_id = connection.execute(
+                tag_id = (await connection.execute(
                     sqlalchemy.text(
                         """
                         INSERT INTO tag 
@@ -67,10 +117,10 @@ async def create_review(review: ReviewCreate):
                         RETURNING id
                         """    
                     ), {'name': tag}
-                ).scalar()
+                )).scalar()
                 
                 # link tag to review
-                connection.execute(
+                await connection.execute(
                     sqlalchemy.text(
                         """
                         INSERT INTO review_tags (review_id, tag_id)
@@ -79,7 +129,9 @@ async def create_review(review: ReviewCreate):
                     ),
                     {'review_id': review_id, 'tag_id': tag_id}
                 )
-            return {"id": str(review_id), "message": "Review created successfully"}
+
+            await rollups.apply_reviews(connection, [review_id])
+            await publish(connection, touched)
         except Exception as e:
             print(e)
             raise HTTPException(
@@ -87,44 +139,490 @@ async def create_review(review: ReviewCreate):
                 detail="Error creating review"
             ) from e
 
-async def get_reviews(filter_type: str, filter_value: str):
-    """Get reviews filtered by either course code or professor name."""
-    with db.engine.begin() as connection:
-        where_clause = "UPPER(c.course_code) = UPPER(:filter_value)" if filter_type == "course" else "p.name = :filter_value"
-        
-        reviews = connection.execute(
+    lsn = await db.current_lsn()
+    cache.invalidate(touched, lsn)
+    pin_reads(response, lsn)
+    return {"id": str(review_id), "message": "Review created successfully"}
+
+async def read_bulk_items(request: Request) -> tuple[list, list[dict]]:
+    """
+    Parse a bulk request body into raw items. A JSON array is parsed in one go,
+    NDJSON is consumed line by line as it streams in so a bad line only costs
+    that item.
+    """
+    items = []
+    errors = []
+    content_type = request.headers.get("content-type", "")
+
+    if "ndjson" in content_type or "jsonl" in content_type:
+        buffer = b""
+        index = 0
+
+        def parse_line(line: bytes):
+            nonlocal index
+            if not line.strip():
+                return
+            try:
+                items.append((index, json.loads(line)))
+            except ValueError as e:
+                errors.append({"index": index, "detail": f"Invalid JSON: {e}"})
+            index += 1
+
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                parse_line(line)
+            if index > MAX_BULK_REVIEWS:
+                break
+        parse_line(buffer)
+    else:
+        try:
+            body = json.loads(await request.body())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}") from e
+        if not isinstance(body, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of reviews")
+        items = list(enumerate(body))
+
+    if len(items) + len(errors) > MAX_BULK_REVIEWS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {MAX_BULK_REVIEWS} reviews can be submitted at once"
+        )
+
+    return items, errors
+
+@router.post("/bulk")
+async def create_reviews_bulk(request: Request, response: Response):
+    """
+    Create many reviews at once. Accepts a JSON array of reviews, or NDJSON
+    (one review per line) with an application/x-ndjson content type. Items
+    that fail validation or reference an unknown course/professor pair are
+    reported by index, the rest are inserted.
+    """
+    items, errors = await read_bulk_items(request)
+
+    reviews = []
+    for index, item in items:
+        try:
+            reviews.append((index, ReviewCreate.model_validate(item)))
+        except ValidationError as e:
+            errors.append({"index": index, "detail": json.loads(e.json(include_url=False))})
+
+    inserted = 0
+    async with db.engine.begin() as connection:
+        if reviews:
+            # resolve every distinct course/professor pair in one query
+            pairs = {(review.course_code, review.professor_id) for _, review in reviews}
+            course_ids = {
+                (row.course_code, row.professor_id): row.course_id
+                for row in await connection.execute(
+                    sqlalchemy.text(
+                        """
+                        SELECT n.course_code, n.professor_id, c.id AS course_id
+                        FROM unnest(CAST(:course_codes AS text[]), CAST(:professor_ids AS int[]))
+                            AS n(course_code, professor_id)
+                        JOIN course c ON c.course_code = n.course_code
+                        JOIN professors_courses pc ON pc.course_id = c.id AND pc.professor_id = n.professor_id
+                        """
+                    ),
+                    {
+                        "course_codes": [code for code, _ in pairs],
+                        "professor_ids": [professor_id for _, professor_id in pairs]
+                    }
+                )
+            }
+
+            resolved = []
+            for index, review in reviews:
+                course_id = course_ids.get((review.course_code, review.professor_id))
+                if course_id is None:
+                    errors.append({
+                        "index": index,
+                        "detail": f"Professor {review.professor_id} is not assigned to course {review.course_code}"
+                    })
+                else:
+                    resolved.append((course_id, review))
+            reviews = resolved
+
+        if reviews:
+            # get or create every tag in one statement, sorted so concurrent loads lock in the same order.
+            # DO UPDATE also returns tags another transaction committed meanwhile
+            tag_names = sorted({tag for _, review in reviews for tag in review.tags})
+            tag_ids = {}
+            if tag_names:
+                tag_ids = {
+                    row.name: row.id
+                    for row in await connection.execute(
+                        sqlalchemy.text(
+                            """
+                            INSERT INTO tag (name)
+                            SELECT unnest(CAST(:names AS text[]))
+                            ON CONFLICT (name) DO UPDATE
+                            SET name = EXCLUDED.name
+                            RETURNING id, name
+                            """
+                        ),
+                        {"names": tag_names}
+                    )
+                }
+
+            # reserve the ids up front so review_tags can be copied alongside
+            review_ids = (await connection.execute(
+                sqlalchemy.text(
+                    """
+                    SELECT nextval(pg_get_serial_sequence('review', 'id'))
+                    FROM generate_series(1, :count)
+                    """
+                ),
+                {"count": len(reviews)}
+            )).scalars().all()
+
+            try:
+                raw_connection = (await connection.get_raw_connection()).driver_connection
+                async with raw_connection.cursor() as cursor:
+                    async with cursor.copy(
+                        """
+                        COPY review (id, course_id, professor_id, term, difficulty,
+                                     overall_rating, workload_rating, comments)
+                        FROM STDIN
+                        """
+                    ) as copy:
+                        for review_id, (course_id, review) in zip(review_ids, reviews):
+                            await copy.write_row((
+                                review_id,
+                                course_id,
+                                review.professor_id,
+                                review.term,
+                                review.difficulty_rating,
+                                review.overall_rating,
+                                review.workload_estimate,
+                                review.comments
+                            ))
+
+                    async with cursor.copy("COPY review_tags (review_id, tag_id) FROM STDIN") as copy:
+                        for review_id, (_, review) in zip(review_ids, reviews):
+                            for tag_id in {tag_ids[tag] for tag in review.tags}:
+                                await copy.write_row((review_id, tag_id))
+
+                await rollups.apply_reviews(connection, review_ids)
+
+                touched = {course_tag(review.course_code) for _, review in reviews}
+                touched |= {professor_tag(review.professor_id) for _, review in reviews}
+                await publish(connection, touched)
+            except Exception as e:
+                print(e)
+                raise HTTPException(
+                    status_code=500,
+                    detail="Error creating reviews"
+                ) from e
+            inserted = len(review_ids)
+
+    if inserted:
+        lsn = await db.current_lsn()
+        cache.invalidate(touched, lsn)
+        pin_reads(response, lsn)
+
+    errors.sort(key=lambda error: error["index"])
+    return {
+        "inserted": inserted,
+        "failed": len(errors),
+        "errors": errors
+    }
+
+async def export_rows(query: str, params: dict, format: str):
+    """
+    Yield the export body chunk by chunk. Rows come from a server-side cursor
+    EXPORT_CHUNK_SIZE at a time, so memory stays flat however many match.
+    """
+    if format == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(EXPORT_COLUMNS)
+        yield buffer.getvalue()
+
+    async with db.read_connection() as connection:
+        result = await connection.stream(
+            sqlalchemy.text(query).execution_options(yield_per=EXPORT_CHUNK_SIZE),
+            params
+        )
+
+        async for rows in result.partitions():
+            if format == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                for row in rows:
+                    writer.writerow([
+                        row.id,
+                        row.course_code,
+                        row.course_name,
+                        row.professor_id,
+                        row.term,
+                        row.difficulty,
+                        row.overall_rating,
+                        row.workload_rating,
+                        row.comments,
+                        ";".join(row.tags or [])
+                    ])
+                yield buffer.getvalue()
+            else:
+                yield "".join(
+                    json.dumps({
+                        "review_id": row.id,
+                        "course_code": row.course_code,
+                        "course_name": row.course_name,
+                        "professor_id": row.professor_id,
+                        "term": row.term,
+                        "difficulty_rating": row.difficulty,
+                        "overall_rating": row.overall_rating,
+                        "workload_estimate": row.workload_rating,
+                        "comments": row.comments,
+                        "tags": row.tags or []
+                    }) + "\n"
+                    for row in rows
+                )
+
+@router.get("/export")
+async def export_reviews(
+    course_code: Optional[str] = None,
+    professor_id: Optional[int] = None,
+    department: Optional[str] = Query(None, description="Department abbreviation, e.g. CSC"),
+    term: Optional[str] = Query(None, example="Spring 2025"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+):
+    """
+    Stream every review matching the filters as NDJSON or CSV, oldest first.
+    Meant for analytics pulls, use the paginated listings for browsing.
+    """
+    query = """
+    SELECT
+        r.id,
+        c.course_code,
+        c.name AS course_name,
+        r.professor_id,
+        r.term,
+        r.difficulty,
+        r.overall_rating,
+        r.workload_rating,
+        r.comments,
+        ARRAY(
+            SELECT t.name
+            FROM review_tags rt
+            JOIN tag t ON t.id = rt.tag_id
+            WHERE rt.review_id = r.id
+        ) AS tags
+    FROM review r
+    JOIN course c ON c.id = r.course_id
+    WHERE 1=1
+    """
+    params = {}
+
+    if course_code:
+        query += " AND c.course_code = UPPER(:course_code)"
+        params["course_code"] = course_code
+    if professor_id is not None:
+        query += " AND r.professor_id = :professor_id"
+        params["professor_id"] = professor_id
+    if department:
+        query += """
+        AND EXISTS (
+            SELECT 1
+            FROM department_courses dc
+            JOIN department d ON d.id = dc.department_id
+            WHERE dc.course_id = r.course_id AND d.abbrev = UPPER(:department)
+        )
+        """
+        params["department"] = department
+    if term:
+        query += " AND r.term = :term"
+        params["term"] = term
+
+    query += " ORDER BY r.id"
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        export_rows(query, params, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=reviews.{format}"}
+    )
+
+def encode_cursor(position: dict) -> str:
+    """Turn the sort key of the last row on a page into an opaque cursor."""
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+def decode_cursor(cursor: str, keys: tuple[str, ...]) -> dict:
+    """
+    Reverse encode_cursor, rejecting anything we did not hand out. review_id
+    comes back as an int and rank as a finite float.
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(position, dict) or set(position) != set(keys):
+            raise ValueError("unexpected cursor keys")
+
+        review_id = position["review_id"]
+        # bool is an int too
+        if not isinstance(review_id, int) or isinstance(review_id, bool):
+            raise ValueError("unexpected review_id")
+        decoded = {"review_id": review_id}
+
+        if "rank" in position:
+            rank = position["rank"]
+            # NaN, and 1e999 which decodes to inf, would only fail in Postgres
+            if isinstance(rank, bool) or not isinstance(rank, (int, float)) or not math.isfinite(rank):
+                raise ValueError("unexpected rank")
+            decoded["rank"] = float(rank)
+        return decoded
+    except (ValueError, OverflowError) as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
+
+@router.get("/search")
+async def search_reviews(
+    q: str = Query(..., min_length=2, max_length=200, description="Search terms, e.g. \"group project\""),
+    course_code: Optional[str] = None,
+    professor_id: Optional[int] = None,
+    term: Optional[str] = Query(None, example="Spring 2025"),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+):
+    """
+    Full-text search over review comments, best matches first. Uses the GIN
+    index on review.comments_tsv and is keyset paginated on (rank, review id).
+    """
+    where_clause = "r.comments_tsv @@ query.q"
+    params = {"q": q, "limit": limit + 1}
+
+    if course_code:
+        where_clause += " AND c.course_code = UPPER(:course_code)"
+        params["course_code"] = course_code
+    if professor_id is not None:
+        where_clause += " AND r.professor_id = :professor_id"
+        params["professor_id"] = professor_id
+    if term:
+        where_clause += " AND r.term = :term"
+        params["term"] = term
+    if cursor is not None:
+        position = decode_cursor(cursor, ("rank", "review_id"))
+        where_clause += """
+            AND (ts_rank(r.comments_tsv, query.q)::float8, r.id) < (:after_rank, :after_review_id)
+        """
+        params["after_rank"] = position["rank"]
+        params["after_review_id"] = position["review_id"]
+
+    async with db.read_connection() as connection:
+        results = (await connection.execute(
             sqlalchemy.text(
                 f"""
-                SELECT r.id, r.term, r.difficulty, r.overall_rating, 
-                       r.workload_rating, r.comments,
-                       c.name as course_name, c.course_code,
-                       p.name as professor_name,
-                       array_agg(t.name) as tags
-                FROM review r
-                JOIN course c ON r.course_id = c.id
-                JOIN professors_courses pc ON c.id = pc.course_id
-                JOIN professor p ON p.id = pc.professor_id
-                LEFT JOIN review_tags rt ON r.id = rt.review_id
-                LEFT JOIN tag t ON rt.tag_id = t.id
-                WHERE {where_clause}
-                GROUP BY r.id, r.term, r.difficulty, r.overall_rating, 
-                         r.workload_rating, r.comments, c.name, 
-                         c.course_code, p.name
-                ORDER BY r.id DESC
+                WITH page AS (
+                    SELECT
+                        r.id,
+                        r.term,
+                        r.difficulty,
+                        r.overall_rating,
+                        r.workload_rating,
+                        r.comments,
+                        c.name as course_name,
+                        c.course_code,
+                        ts_rank(r.comments_tsv, query.q)::float8 as rank,
+                        query.q
+                    FROM websearch_to_tsquery('english', :q) query(q)
+                    JOIN review r ON true
+                    JOIN course c ON c.id = r.course_id
+                    WHERE {where_clause}
+                    ORDER BY rank DESC, r.id DESC
+                    LIMIT :limit
+                )
+                SELECT
+                    page.*,
+                    ts_headline('english', page.comments, page.q) as snippet
+                FROM page
+                ORDER BY page.rank DESC, page.id DESC
                 """
             ),
-            {"filter_value": filter_value}
-        ).fetchall()
+            params
+        )).fetchall()
 
-        if not reviews and filter_type == "professor":
-            raise HTTPException(
-                status_code=404,
-                detail=f"No reviews found for professor {filter_value}"
-            )
-        elif not reviews:
-            return []
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        next_cursor = encode_cursor({"rank": results[-1].rank, "review_id": results[-1].id})
+
+    return {
+        "results": [
+            {
+                "review_id": row.id,
+                "rank": row.rank,
+                "snippet": row.snippet,
+                "term": row.term,
+                "difficulty_rating": row.difficulty,
+                "overall_rating": row.overall_rating,
+                "workload_estimate": row.workload_rating,
+                "comments": row.comments,
+                "course_name": row.course_name,
+                "course_code": row.course_code,
+            }
+            for row in results
+        ],
+        "next_cursor": next_cursor
+    }
+
+async def get_reviews(filter_type: str, filter_value: str, limit: int, cursor: Optional[str]):
+    """
+    Get one page of reviews filtered by either course code or professor name,
+    newest first. Pages are keyset paginated on the review id, so a deep page
+    costs the same as the first one.
+    """
+    where_clause = "c.course_code = UPPER(:filter_value)" if filter_type == "course" else "p.name = :filter_value"
+    params = {"filter_value": filter_value, "limit": limit + 1}
+
+    if cursor is not None:
+        position = decode_cursor(cursor, ("review_id",))
+        where_clause += " AND r.id < :after_review_id"
+        params["after_review_id"] = position["review_id"]
+
+    async with db.read_connection() as connection:
+        reviews = (await connection.execute(
+            sqlalchemy.text(
+                f"""
+                WITH page AS (
+                    SELECT r.id, r.term, r.difficulty, r.overall_rating, 
+                           r.workload_rating, r.comments,
+                           c.name as course_name, c.course_code,
+                           p.name as professor_name
+                    FROM review r
+                    JOIN course c ON r.course_id = c.id
+                    {"LEFT JOIN" if filter_type == "course" else "JOIN"} professor p ON p.id = r.professor_id
+                    WHERE {where_clause}
+                    ORDER BY r.id DESC
+                    LIMIT :limit
+                )
+                SELECT page.*, tags.tags
+                FROM page
+                LEFT JOIN LATERAL (
+                    SELECT array_agg(t.name) as tags
+                    FROM review_tags rt
+                    JOIN tag t ON rt.tag_id = t.id
+                    WHERE rt.review_id = page.id
+                ) tags ON true
+                ORDER BY page.id DESC
+                """
+            ),
+            params
+        )).fetchall()
+
+    if not reviews and filter_type == "professor" and cursor is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No reviews found for professor {filter_value}"
+        )
+
+    next_cursor = None
+    if len(reviews) > limit:
+        reviews = reviews[:limit]
+        next_cursor = encode_cursor({"review_id": reviews[-1].id})
 
-        return [
+    return FastJSONResponse({
+        "reviews": [
             {
                 "review_id": review.id,
                 "term": review.term,
@@ -138,14 +636,24 @@ async def get_reviews(filter_type: str, filter_value: str):
                 "tags": [tag for tag in (review.tags or []) if tag is not None]
             }
             for review in reviews
-        ]
+        ],
+        "next_cursor": next_cursor
+    })
 
 @router.get("/course/{course_code}")
-async def get_course_reviews(course_code: str):
-    """Get all reviews for a specific course."""
-    return await get_reviews("course", course_code)
+async def get_course_reviews(
+    course_code: str,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page")
+):
+    """Get a page of reviews for a specific course."""
+    return await get_reviews("course", course_code, limit, cursor)
 
 @router.get("/professor/{professor_name}")
-async def get_professor_reviews(professor_name: str):
-    """Get all reviews for a specific professor."""
-    return await get_reviews("professor", professor_name)
\ No newline at end of file
+async def get_professor_reviews(
+    professor_name: str,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page")
+):
+    """Get a page of reviews for a specific professor."""
+    return await get_reviews("professor", professor_name, limit, cursor)
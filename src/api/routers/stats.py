@@ -1,77 +1,299 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+import logging
 import sqlalchemy
-from src.api.routers.models import ReviewCreate
+import time
 from src import database as db
+from src import rollups
+from src.cache import ALL_TAG, cache, publish
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/stats", tags=["stats"])
 
-# cron job running every 24 hours
+
+async def refresh_in_chunks(phase: str, table: str, statements: list[str], chunk_size: int, lock: str | None = None) -> dict:
+    """
+    Run refresh statements over `table` one id range at a time.
+
+    Every chunk is its own short transaction. The rows being rewritten are
+    locked first (`lock`, defaults to the rows of `table` itself) so a review
+    committed while the chunk runs is either already in the recomputed numbers
+    or applies its increment after we are done.
+    """
+    if lock is None:
+        lock = f"SELECT id FROM {table} WHERE id BETWEEN :low AND :high ORDER BY id FOR UPDATE"
+
+    start = time.perf_counter()
+    async with db.engine.begin() as connection:
+        bounds = (await connection.execute(
+            sqlalchemy.text(f"SELECT MIN(id) AS low, MAX(id) AS high FROM {table}")
+        )).first()
+
+    rows = 0
+    chunks = 0
+    if bounds.low is not None:
+        for low in range(bounds.low, bounds.high + 1, chunk_size):
+            params = {"low": low, "high": low + chunk_size - 1}
+            async with db.engine.begin() as connection:
+                await connection.execute(sqlalchemy.text(lock), params)
+                for statement in statements:
+                    rows += (await connection.execute(sqlalchemy.text(statement), params)).rowcount
+            chunks += 1
+
+    return {
+        "phase": phase,
+        "rows": rows,
+        "chunks": chunks,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+    }
+
+
+DEPARTMENT_STATS_LOCK = """
+SELECT department_id
+FROM department_stats
+WHERE department_id BETWEEN :low AND :high
+ORDER BY department_id
+FOR UPDATE
+"""
+
+# cron job running every 24 hours, reviews keep the counters current in between
+# so this only corrects drift
 @router.post("/refresh")
-async def refresh_all_statistics():
-    """Update statistics for all courses and professors."""
-    with db.engine.begin() as connection:
-        try:
-            # update all course statistics
-            connection.execute(
-                sqlalchemy.text(
-                    """
-                    UPDATE course c
-                    SET 
-                        avg_workload = COALESCE((
-                            SELECT AVG(workload_rating)
-                            FROM review
-                            WHERE course_id = c.id
-                        ), 0),
-                        avg_rating = COALESCE((
-                            SELECT ROUND(AVG(overall_rating), 2)
-                            FROM review
-                            WHERE course_id = c.id
-                        ), 0)
-                    """
-                )
-            )
-
-            # update all professor statistics
-            connection.execute(
-                sqlalchemy.text(
-                    """
-                    UPDATE professor p
-                    SET 
-                        avg_workload = COALESCE((
-                            SELECT AVG(r.workload_rating)
-                            FROM review r
-                            JOIN professors_courses pc ON r.course_id = pc.course_id
-                            WHERE pc.professor_id = p.id
-                        ), 0),
-                        avg_difficulty = COALESCE((
-                            SELECT AVG(r.difficulty)
-                            FROM review r
-                            JOIN professors_courses pc ON r.course_id = pc.course_id
-                            WHERE pc.professor_id = p.id
-                        ), 0),
-                        avg_rating = COALESCE((
-                            SELECT ROUND(AVG(r.overall_rating), 2)
-                            FROM review r
-                            JOIN professors_courses pc ON r.course_id = pc.course_id
-                            WHERE pc.professor_id = p.id
-                        ), 0),
-                        total_reviews = (
-                            SELECT COUNT(*)
-                            FROM review r
-                            JOIN professors_courses pc ON r.course_id = pc.course_id
-                            WHERE pc.professor_id = p.id
-                        )
-                    """
+async def refresh_all_statistics(chunk_size: int = Query(1000, ge=1, le=100000)):
+    """Update statistics, tag counts and term rollups for all courses, professors and departments."""
+    try:
+        phases = []
+
+        # the one grouped pass over review, per course range. Course and
+        # professor counters are then rolled up from course_term_stats
+        phases.append(await refresh_in_chunks(
+            "course_terms",
+            "course",
+            [
+                """
+                DELETE FROM course_term_stats
+                WHERE course_id BETWEEN :low AND :high
+                """,
+                """
+                INSERT INTO course_term_stats
+                    (course_id, term, professor_id, review_count,
+                     rating_sum, difficulty_sum, workload_sum)
+                SELECT
+                    course_id,
+                    term,
+                    professor_id,
+                    COUNT(*),
+                    SUM(overall_rating),
+                    SUM(difficulty),
+                    SUM(workload_rating)
+                FROM review
+                WHERE course_id BETWEEN :low AND :high
+                GROUP BY course_id, term, professor_id
+                """
+            ],
+            chunk_size
+        ))
+
+        phases.append(await refresh_in_chunks(
+            "courses",
+            "course",
+            ["""
+            UPDATE course c
+            SET
+                review_count = s.review_count,
+                rating_sum = s.rating_sum,
+                difficulty_sum = s.difficulty_sum,
+                workload_sum = s.workload_sum,
+                avg_rating = COALESCE(ROUND(s.rating_sum::numeric / NULLIF(s.review_count, 0), 2), 0),
+                avg_workload = COALESCE(ROUND(s.workload_sum::numeric / NULLIF(s.review_count, 0)), 0)
+            FROM (
+                SELECT
+                    c2.id,
+                    COALESCE(SUM(cts.review_count), 0) AS review_count,
+                    COALESCE(SUM(cts.rating_sum), 0) AS rating_sum,
+                    COALESCE(SUM(cts.difficulty_sum), 0) AS difficulty_sum,
+                    COALESCE(SUM(cts.workload_sum), 0) AS workload_sum
+                FROM course c2
+                LEFT JOIN course_term_stats cts ON cts.course_id = c2.id
+                WHERE c2.id BETWEEN :low AND :high
+                GROUP BY c2.id
+            ) s
+            WHERE c.id = s.id
+            """],
+            chunk_size
+        ))
+
+        phases.append(await refresh_in_chunks(
+            "professors",
+            "professor",
+            ["""
+            UPDATE professor p
+            SET
+                total_reviews = s.review_count,
+                rating_sum = s.rating_sum,
+                difficulty_sum = s.difficulty_sum,
+                workload_sum = s.workload_sum,
+                avg_rating = COALESCE(ROUND(s.rating_sum::numeric / NULLIF(s.review_count, 0), 2), 0),
+                avg_difficulty = COALESCE(s.difficulty_sum::numeric / NULLIF(s.review_count, 0), 0),
+                avg_workload = COALESCE(s.workload_sum::numeric / NULLIF(s.review_count, 0), 0)
+            FROM (
+                SELECT
+                    p2.id,
+                    COALESCE(SUM(cts.review_count), 0) AS review_count,
+                    COALESCE(SUM(cts.rating_sum), 0) AS rating_sum,
+                    COALESCE(SUM(cts.difficulty_sum), 0) AS difficulty_sum,
+                    COALESCE(SUM(cts.workload_sum), 0) AS workload_sum
+                FROM professor p2
+                LEFT JOIN course_term_stats cts ON cts.professor_id = p2.id
+                WHERE p2.id BETWEEN :low AND :high
+                GROUP BY p2.id
+            ) s
+            WHERE p.id = s.id
+            """],
+            chunk_size
+        ))
+
+        # departments are rolled up from the course counters as well
+        phases.append(await refresh_in_chunks(
+            "departments",
+            "department",
+            ["""
+            INSERT INTO department_stats
+                (department_id, total_courses, total_professors, total_reviews,
+                 rating_sum, difficulty_sum, workload_sum)
+            SELECT
+                d.id,
+                COALESCE(cs.total_courses, 0),
+                COALESCE(ps.total_professors, 0),
+                COALESCE(cs.total_reviews, 0),
+                COALESCE(cs.rating_sum, 0),
+                COALESCE(cs.difficulty_sum, 0),
+                COALESCE(cs.workload_sum, 0)
+            FROM department d
+            LEFT JOIN (
+                SELECT
+                    dc.department_id,
+                    COUNT(*) AS total_courses,
+                    SUM(c.review_count) AS total_reviews,
+                    SUM(c.rating_sum) AS rating_sum,
+                    SUM(c.difficulty_sum) AS difficulty_sum,
+                    SUM(c.workload_sum) AS workload_sum
+                FROM department_courses dc
+                JOIN course c ON c.id = dc.course_id
+                WHERE dc.department_id BETWEEN :low AND :high
+                GROUP BY dc.department_id
+            ) cs ON cs.department_id = d.id
+            LEFT JOIN (
+                SELECT dc.department_id, COUNT(DISTINCT pc.professor_id) AS total_professors
+                FROM department_courses dc
+                JOIN professors_courses pc ON pc.course_id = dc.course_id
+                WHERE dc.department_id BETWEEN :low AND :high
+                GROUP BY dc.department_id
+            ) ps ON ps.department_id = d.id
+            WHERE d.id BETWEEN :low AND :high
+            ON CONFLICT (department_id) DO UPDATE
+            SET
+                total_courses = EXCLUDED.total_courses,
+                total_professors = EXCLUDED.total_professors,
+                total_reviews = EXCLUDED.total_reviews,
+                rating_sum = EXCLUDED.rating_sum,
+                difficulty_sum = EXCLUDED.difficulty_sum,
+                workload_sum = EXCLUDED.workload_sum
+            """],
+            chunk_size,
+            lock=DEPARTMENT_STATS_LOCK
+        ))
+
+        # departments reuse the course tag counts, professors need their own pass
+        phases.append(await refresh_in_chunks(
+            "course_tags",
+            "course",
+            [
+                """
+                DELETE FROM course_tag_counts
+                WHERE course_id BETWEEN :low AND :high
+                """,
+                """
+                INSERT INTO course_tag_counts (course_id, tag_id, tag_count)
+                SELECT r.course_id, rt.tag_id, COUNT(*)
+                FROM review r
+                JOIN review_tags rt ON rt.review_id = r.id
+                WHERE r.course_id BETWEEN :low AND :high
+                GROUP BY r.course_id, rt.tag_id
+                """
+            ],
+            chunk_size
+        ))
+
+        phases.append(await refresh_in_chunks(
+            "professor_tags",
+            "professor",
+            [
+                """
+                DELETE FROM professor_tag_counts
+                WHERE professor_id BETWEEN :low AND :high
+                """,
+                """
+                INSERT INTO professor_tag_counts (professor_id, tag_id, tag_count)
+                SELECT r.professor_id, rt.tag_id, COUNT(*)
+                FROM review r
+                JOIN review_tags rt ON rt.review_id = r.id
+                WHERE r.professor_id BETWEEN :low AND :high
+                GROUP BY r.professor_id, rt.tag_id
+                """
+            ],
+            chunk_size
+        ))
+
+        phases.append(await refresh_in_chunks(
+            "department_tags",
+            "department",
+            [
+                """
+                DELETE FROM department_tag_counts
+                WHERE department_id BETWEEN :low AND :high
+                """,
+                """
+                INSERT INTO department_tag_counts (department_id, tag_id, tag_count)
+                SELECT dc.department_id, ctc.tag_id, SUM(ctc.tag_count)
+                FROM department_courses dc
+                JOIN course_tag_counts ctc ON ctc.course_id = dc.course_id
+                WHERE dc.department_id BETWEEN :low AND :high
+                GROUP BY dc.department_id, ctc.tag_id
+                """,
+                f"""
+                UPDATE department_stats ds
+                SET top_tags = ARRAY(
+                    SELECT t.name
+                    FROM department_tag_counts dtc
+                    JOIN tag t ON t.id = dtc.tag_id
+                    WHERE dtc.department_id = ds.department_id
+                    ORDER BY dtc.tag_count DESC, t.name
+                    LIMIT {rollups.TOP_TAGS}
                 )
-            )
-
-            return {
-                "message": "Statistics refreshed successfully"
-            }
-
-        except Exception as e:
-            print(e)
-            raise HTTPException(
-                status_code=500,
-                detail="Error refreshing statistics"
-            ) from e
\ No newline at end of file
+                WHERE ds.department_id BETWEEN :low AND :high
+                """
+            ],
+            chunk_size,
+            lock=DEPARTMENT_STATS_LOCK
+        ))
+
+        for phase in phases:
+            logger.info("refresh %s: %s rows in %s ms", phase["phase"], phase["rows"], phase["elapsed_ms"])
+
+        # every counter may have moved, in every worker
+        async with db.engine.begin() as connection:
+            await publish(connection, [ALL_TAG])
+        cache.invalidate([ALL_TAG], await db.current_lsn())
+
+        return {
+            "message": "Statistics refreshed successfully",
+            "phases": phases
+        }
+
+    except Exception as e:
+        print(e)
+        raise HTTPException(
+            status_code=500,
+            detail="Error refreshing statistics"
+        ) from e
@@ -1,11 +1,37 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from starlette.middleware.cors import CORSMiddleware
-from src.api.routers import courses, professors, reviews, departments, stats
+from starlette.routing import Match
+from contextlib import asynccontextmanager
+import asyncio
+import time
+from src.api.routers import courses, professors, reviews, departments, stats, admin
+from src import cache
+from src import config
+from src import database as db
+from src import metrics
+from src import profiling
+from src import singleflight
+from src.api.responses import FastJSONResponse
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # each worker listens for invalidations published by the others
+    listener = None
+    if config.get_settings().CACHE_ENABLED:
+        listener = asyncio.create_task(cache.listen())
+    yield
+    if listener is not None:
+        listener.cancel()
+
 
 app = FastAPI(
     title="Schedule Wizards",
     version="0.0.1",
     terms_of_service="http://example.com/terms/",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 origins = ["*"]
@@ -18,12 +44,136 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    """Carry the client's last write position to read_connection."""
+    lsn = request.cookies.get(db.LSN_COOKIE) or request.headers.get("X-Min-LSN")
+    db.min_lsn.set(lsn if lsn and db.LSN_PATTERN.match(lsn) else None)
+    return await call_next(request)
+
+def route_template(request: Request) -> str:
+    """The path template the request will be routed to, e.g. /courses/{course_code}."""
+    partial = None
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    return partial or "unmatched"
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Time every request under its route template, and let query metrics see the route."""
+    route = route_template(request)
+    metrics.current_route.set(route)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.request_duration.observe(time.perf_counter() - start, route, request.method, str(status))
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    """Run requests that ask for it under the profiler, see src/profiling.py."""
+    if not profiling.requested(request.headers, request.query_params) or not profiling.start():
+        return await call_next(request)
+
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        profile_id = profiling.stop(
+            request.method,
+            route_template(request),
+            request.url.path,
+            status,
+            time.perf_counter() - start
+        )
+    response.headers["X-Profile-Id"] = profile_id
+    return response
+
 # Include our routers
 app.include_router(courses.router)
 app.include_router(professors.router)
 app.include_router(reviews.router)
 app.include_router(departments.router)
 app.include_router(stats.router)
+app.include_router(admin.router)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus scrape endpoint, numbers are per worker."""
+    engines = {"primary": db.engine}
+    engines.update({f"replica{i}": replica for i, replica in enumerate(db.replicas)})
+    pools = {name: db.pool_status(engine) for name, engine in engines.items()}
+    cache_stats = cache.cache.stats()
+    coalescing = singleflight.stats()["routes"]
+
+    extra = (
+        metrics.collected(
+            "gauge",
+            "db_pool_checked_out",
+            "Connections currently handed out by the pool.",
+            ("engine",),
+            {(name,): pool["checked_out"] for name, pool in pools.items()}
+        )
+        + metrics.collected(
+            "gauge",
+            "db_pool_overflow",
+            "Connections open beyond pool_size.",
+            ("engine",),
+            {(name,): pool["overflow"] for name, pool in pools.items()}
+        )
+        + metrics.collected(
+            "counter",
+            "db_pool_checkout_wait_seconds_total",
+            "Total time spent waiting for a pooled connection.",
+            ("engine",),
+            {(name,): pool["wait_ms_total"] / 1000 for name, pool in pools.items()}
+        )
+        + metrics.collected(
+            "counter",
+            "db_pool_checkout_timeouts_total",
+            "Checkouts that gave up after pool_timeout.",
+            ("engine",),
+            {(name,): pool["timeouts"] for name, pool in pools.items()}
+        )
+        + metrics.collected(
+            "counter",
+            "response_cache_hits_total",
+            "Responses served from the in-process cache.",
+            ("route",),
+            {(route,): counts["hits"] for route, counts in cache_stats["routes"].items()}
+        )
+        + metrics.collected(
+            "counter",
+            "response_cache_misses_total",
+            "Cacheable responses that had to be computed.",
+            ("route",),
+            {(route,): counts["misses"] for route, counts in cache_stats["routes"].items()}
+        )
+        + metrics.collected(
+            "gauge",
+            "response_cache_bytes",
+            "Size of the cached response bodies.",
+            (),
+            {(): cache_stats["bytes"]}
+        )
+        + metrics.collected(
+            "counter",
+            "coalesced_requests_total",
+            "Requests that shared an identical in-flight execution.",
+            ("route",),
+            {(route,): counts["coalesced"] for route, counts in coalescing.items()}
+        )
+    )
+    return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 async def root():
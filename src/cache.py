@@ -0,0 +1,321 @@
+"""
+In-process cache of encoded GET responses.
+
+Entries are tagged with what their payload was built from ("course:CSC101",
+"professor:12", "departments"). Write endpoints publish those tags with
+NOTIFY inside their transaction, so every worker's listener hears them once
+the write commits, and invalidate their own worker's copy right after commit.
+The per-route TTL is only a backstop.
+
+With read replicas, an invalidation also carries the primary's WAL position
+at the write: read after commit by the writer, and taken by the NOTIFY itself
+for everyone else. Until READ_YOUR_WRITES_SECONDS pass, fills only read from a
+replica that has replayed it (or the primary), so a lagging replica cannot
+put the old payload back.
+"""
+from collections import Counter, OrderedDict
+from fastapi import Response
+from sqlalchemy.engine import make_url
+from typing import Callable
+import asyncio
+import functools
+import itertools
+import json
+import logging
+import os
+import psycopg
+import sqlalchemy
+import time
+import uuid
+from src import config
+from src import database as db
+from src.api.responses import FastJSONResponse, dumps
+
+logger = logging.getLogger(__name__)
+
+DEPARTMENTS_TAG = "departments"
+
+# published to drop every entry, e.g. after a full statistics refresh
+ALL_TAG = "*"
+
+NOTIFY_CHANNEL = "cache_invalidation"
+
+# NOTIFY payloads must stay under 8000 bytes
+NOTIFY_PAYLOAD_BYTES = 7000
+
+# seconds between attempts to re-establish a lost listener connection
+LISTEN_RETRY_SECONDS = 5
+
+# tells this worker's own notifications apart from everyone else's
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def course_tag(course_code: str) -> str:
+    return f"course:{course_code.upper()}"
+
+
+def professor_tag(professor_id: int | str) -> str:
+    return f"professor:{professor_id}"
+
+
+class Entry:
+    __slots__ = ("body", "expires", "tags", "size")
+
+    def __init__(self, body: bytes, expires: float, tags: list[str], size: int):
+        self.body = body
+        self.expires = expires
+        self.tags = tags
+        self.size = size
+
+
+class ResponseCache:
+    """
+    LRU over encoded response bodies, bounded by their total size in bytes.
+
+    Every fill and invalidation takes a number from the same clock. A fill
+    that started before one of its tags was invalidated is dropped, so a read
+    racing a write cannot put the old payload back.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[str, Entry] = OrderedDict()
+        self.keys_by_tag: dict[str, set[str]] = {}
+        self.invalidated_at: dict[str, int] = {}
+        self.clock = itertools.count(1)
+        self.cleared_at = 0
+        # latest write position fills must see, and until when
+        self.fill_lsn: str | None = None
+        self.fill_lsn_until = 0.0
+        self.size = 0
+        self.hits: Counter[str] = Counter()
+        self.misses: Counter[str] = Counter()
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.published = 0
+        self.received = 0
+        self.listening = False
+
+    def version(self) -> int:
+        return next(self.clock)
+
+    def get(self, key: str) -> bytes | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires <= time.monotonic():
+            self.drop(key)
+            self.expirations += 1
+            return None
+        self.entries.move_to_end(key)
+        return entry.body
+
+    def put(self, key: str, body: bytes, ttl: float, tags: list[str], version: int) -> None:
+        if version < self.cleared_at:
+            return
+        if any(self.invalidated_at.get(tag, 0) > version for tag in tags):
+            return
+
+        self.drop(key)
+        size = len(body) + len(key)
+        if size > self.max_bytes:
+            return
+
+        self.entries[key] = Entry(body, time.monotonic() + ttl, tags, size)
+        self.size += size
+        for tag in tags:
+            self.keys_by_tag.setdefault(tag, set()).add(key)
+
+        while self.size > self.max_bytes:
+            self.drop(next(iter(self.entries)))
+            self.evictions += 1
+
+    def drop(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= entry.size
+        for tag in entry.tags:
+            keys = self.keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.keys_by_tag[tag]
+
+    def invalidate(self, tags, lsn: str | None = None) -> None:
+        """
+        Drop every entry built from any of `tags`. `lsn` is the primary's WAL
+        position once the write committed, None without replicas.
+        """
+        if lsn is not None:
+            if self.fill_lsn is None or db.lsn_value(lsn) > db.lsn_value(self.fill_lsn):
+                self.fill_lsn = lsn
+            self.fill_lsn_until = time.monotonic() + config.get_settings().READ_YOUR_WRITES_SECONDS
+
+        tags = set(tags)
+        if ALL_TAG in tags:
+            self.clear()
+            return
+
+        now = self.version()
+        for tag in tags:
+            self.invalidated_at[tag] = now
+            for key in list(self.keys_by_tag.get(tag, ())):
+                self.drop(key)
+                self.invalidations += 1
+
+    def replica_lsn(self) -> str | None:
+        """WAL position a replica must have replayed to serve a fill."""
+        if self.fill_lsn is not None and time.monotonic() < self.fill_lsn_until:
+            return self.fill_lsn
+        return None
+
+    def clear(self) -> None:
+        self.cleared_at = self.version()
+        self.entries.clear()
+        self.keys_by_tag.clear()
+        self.invalidated_at.clear()
+        self.size = 0
+
+    def stats(self) -> dict:
+        routes = sorted(set(self.hits) | set(self.misses))
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "notifications": {
+                "listening": self.listening,
+                "published": self.published,
+                "received": self.received
+            },
+            "routes": {
+                route: {
+                    "hits": self.hits[route],
+                    "misses": self.misses[route],
+                    "hit_ratio": round(self.hits[route] / (self.hits[route] + self.misses[route]), 3)
+                }
+                for route in routes
+            }
+        }
+
+
+cache = ResponseCache(config.get_settings().CACHE_MAX_BYTES)
+
+
+def request_key(route: str, params: dict) -> str:
+    return route + "?" + "&".join(f"{name}={params[name]!r}" for name in sorted(params))
+
+
+def cached(route: str, ttl: float, tags: Callable[..., list[str]]):
+    """
+    Cache an endpoint's JSON body per distinct set of path and query
+    parameters. `tags` gets the endpoint's result plus its parameters and
+    names the rows the payload depends on. Errors are never cached, and
+    clients pinned to their own writes skip the cache entirely.
+    """
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(**params):
+            if not config.get_settings().CACHE_ENABLED or db.min_lsn.get() is not None:
+                return FastJSONResponse(await endpoint(**params))
+
+            key = request_key(route, params)
+            body = cache.get(key)
+            if body is not None:
+                cache.hits[route] += 1
+                return Response(body, media_type="application/json", headers={"X-Cache": "HIT"})
+
+            cache.misses[route] += 1
+            version = cache.version()
+            # the payload is shared, so read past every recent write, not just the client's
+            pinned = db.min_lsn.set(cache.replica_lsn())
+            try:
+                result = await endpoint(**params)
+            finally:
+                db.min_lsn.reset(pinned)
+            body = dumps(result)
+            cache.put(key, body, ttl, tags(result, **params), version)
+            return Response(body, media_type="application/json", headers={"X-Cache": "MISS"})
+
+        return wrapper
+
+    return decorator
+
+
+async def publish(connection, tags) -> None:
+    """
+    Announce the tags a write touched to every worker. Sent through the
+    write's own transaction, so listeners only hear about committed changes.
+    """
+    batch = []
+    size = 0
+    for tag in sorted(set(tags)):
+        # quoted and comma separated in the JSON payload
+        if batch and size + len(tag) + 4 > NOTIFY_PAYLOAD_BYTES:
+            await notify(connection, batch)
+            batch = []
+            size = 0
+        batch.append(tag)
+        size += len(tag) + 4
+    if batch:
+        await notify(connection, batch)
+
+
+async def notify(connection, tags: list[str]) -> None:
+    # publish runs last in the write's transaction, so the WAL position read
+    # here is where its commit record goes. Listeners pin their fills to it
+    # without asking the primary themselves
+    await connection.execute(
+        sqlalchemy.text(
+            """
+            SELECT pg_notify(:channel, json_build_object(
+                'origin', CAST(:origin AS text),
+                'tags', CAST(:tags AS text[]),
+                'lsn', pg_current_wal_insert_lsn()::text
+            )::text)
+            """
+        ),
+        {
+            "channel": NOTIFY_CHANNEL,
+            "origin": WORKER_ID,
+            "tags": tags
+        }
+    )
+    cache.published += 1
+
+
+async def listen() -> None:
+    """
+    Evict whatever other workers invalidate, for the life of the process.
+    Notifications sent while disconnected are lost, so the cache is cleared
+    every time the listener (re)connects.
+    """
+    # LISTEN only works on the primary, and outside SQLAlchemy's pool
+    url = make_url(db.connection_url).set(drivername="postgresql")
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(
+                url.render_as_string(hide_password=False),
+                autocommit=True
+            ) as connection:
+                await connection.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                cache.clear()
+                cache.listening = True
+                async for notification in connection.notifies():
+                    message = json.loads(notification.payload)
+                    if message["origin"] != WORKER_ID:
+                        cache.received += 1
+                        cache.invalidate(message["tags"], message.get("lsn") if db.replicas else None)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(
+                "cache listener disconnected, invalidations from other workers are lost until it reconnects: %s", e
+            )
+        finally:
+            cache.listening = False
+        await asyncio.sleep(LISTEN_RETRY_SECONDS)
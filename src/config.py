@@ -9,9 +9,55 @@ load_dotenv(dotenv_path="default.env", override=False)
 load_dotenv(dotenv_path=find_dotenv(".env"), override=True)
 
 
+def env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
 class Settings:
     POSTGRES_URI: str | None = os.getenv("POSTGRES_URI")
 
+    # connection pool, per worker process
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING: bool = env_flag("DB_POOL_PRE_PING", "true")
+
+    # in-process response cache, per worker process
+    CACHE_ENABLED: bool = env_flag("CACHE_ENABLED", "true")
+    CACHE_MAX_BYTES: int = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+    # routes whose concurrent identical requests share one execution
+    COALESCE_ROUTES: set[str] = {
+        route.strip()
+        for route in os.getenv("COALESCE_ROUTES", "department_statistics,professor,course_trends").split(",")
+        if route.strip()
+    }
+
+    # statements slower than this are logged, a sample of them with their plan
+    SLOW_QUERY_MS: float = float(os.getenv("SLOW_QUERY_MS", "500"))
+    SLOW_QUERY_EXPLAIN_SAMPLE: float = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE", "0.1"))
+    SLOW_QUERY_EXPLAIN_TIMEOUT_MS: float = float(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", "60000"))
+    # JSON lines file, e.g. logs/slow_queries.log. Empty to only keep the
+    # in-memory list behind /admin/slow-queries
+    SLOW_QUERY_LOG: str = os.getenv("SLOW_QUERY_LOG", "")
+    SLOW_QUERY_LOG_BYTES: int = int(os.getenv("SLOW_QUERY_LOG_BYTES", str(10 * 1024 * 1024)))
+    SLOW_QUERY_LOG_BACKUPS: int = int(os.getenv("SLOW_QUERY_LOG_BACKUPS", "5"))
+    SLOW_QUERY_KEEP: int = int(os.getenv("SLOW_QUERY_KEEP", "200"))
+
+    # lets requests ask for a profile with X-Profile: 1 or ?profile=1
+    PROFILING_ENABLED: bool = env_flag("PROFILING_ENABLED", "false")
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "profiles")
+
+    # optional read replicas, comma separated. GET handlers read from these
+    POSTGRES_REPLICA_URIS: list[str] = [
+        uri.strip() for uri in os.getenv("POSTGRES_REPLICA_URIS", "").split(",") if uri.strip()
+    ]
+    # how long a replica that failed to connect is skipped
+    REPLICA_RETRY_SECONDS: float = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+    # how long a client keeps checking replicas against its last write
+    READ_YOUR_WRITES_SECONDS: int = int(os.getenv("READ_YOUR_WRITES_SECONDS", "60"))
+
     def __init__(self):
         if not self.POSTGRES_URI:
             raise ValueError("POSTGRES_URI is missing in the environment variables.")
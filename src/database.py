@@ -1,5 +1,177 @@
 from src import config
-from sqlalchemy import create_engine
+from src import metrics
+from src import slow_queries
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+import itertools
+import logging
+import re
+import time
+import sqlalchemy
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+logger = logging.getLogger(__name__)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    The default async queue pool, plus counters for how long checkouts wait.
+    Waiting covers both queueing for a free connection and opening a new one,
+    which is what a request actually pays before its first query.
+    """
+
+    def __init__(self, *args, max_overflow: int = 10, **kwargs):
+        super().__init__(*args, max_overflow=max_overflow, **kwargs)
+        self.max_overflow = max_overflow
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.peak_overflow = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            self.peak_overflow = max(self.peak_overflow, self.overflow())
+
+
+def create_engine(url: str) -> AsyncEngine:
+    settings = config.get_settings()
+    # postgresql+psycopg resolves to psycopg 3's async dialect here, so queries
+    # await the socket instead of blocking the event loop
+    engine = create_async_engine(
+        url,
+        poolclass=TimedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING
+    )
+    metrics.instrument(engine)
+    slow_queries.instrument(engine)
+    return engine
+
+
+def pool_status(engine: AsyncEngine) -> dict:
+    """Current occupancy and cumulative wait counters of an engine's pool."""
+    pool = engine.sync_engine.pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        # negative until the pool has opened pool_size connections
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": pool.max_overflow,
+        "peak_overflow": pool.peak_overflow,
+        "timeout_s": pool.timeout(),
+        "checkouts": pool.checkouts,
+        "timeouts": pool.timeouts,
+        "wait_ms_total": round(pool.wait_seconds * 1000, 1),
+        "wait_ms_avg": round(pool.wait_seconds * 1000 / pool.checkouts, 3) if pool.checkouts else 0,
+        "wait_ms_max": round(pool.max_wait_seconds * 1000, 1)
+    }
+
 
 connection_url = config.get_settings().POSTGRES_URI
-engine = create_engine(connection_url, pool_pre_ping=True)
+engine = create_engine(connection_url)
+
+# writes always go to engine, reads may go to one of these
+replicas = [create_engine(uri) for uri in config.get_settings().POSTGRES_REPLICA_URIS]
+replica_down_until = {id(replica): 0.0 for replica in replicas}
+replica_turn = itertools.count()
+
+# WAL position of the client's last write, set per request from the
+# min_lsn cookie (or X-Min-LSN header) so it can read its own writes
+LSN_COOKIE = "min_lsn"
+LSN_PATTERN = re.compile(r"^[0-9A-Fa-f]{1,8}/[0-9A-Fa-f]{1,8}$")
+min_lsn: ContextVar[str | None] = ContextVar("min_lsn", default=None)
+
+
+def lsn_value(lsn: str) -> int:
+    """A pg_lsn such as 16/B374D848 as a comparable number."""
+    high, low = lsn.split("/")
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+def healthy_replicas() -> list[AsyncEngine]:
+    """Replicas not benched after a failed connect, rotated round-robin."""
+    now = time.monotonic()
+    healthy = [replica for replica in replicas if replica_down_until[id(replica)] <= now]
+    if not healthy:
+        return []
+    turn = next(replica_turn) % len(healthy)
+    return healthy[turn:] + healthy[:turn]
+
+
+async def replica_has_replayed(connection: AsyncConnection, lsn: str) -> bool:
+    async with connection.begin():
+        return (await connection.execute(
+            sqlalchemy.text(
+                "SELECT COALESCE(pg_last_wal_replay_lsn() >= CAST(:lsn AS pg_lsn), true)"
+            ),
+            {"lsn": lsn}
+        )).scalar_one()
+
+
+@asynccontextmanager
+async def read_connection():
+    """
+    A read-only transaction on a replica when one is configured and healthy,
+    otherwise on the primary. A replica that cannot be reached, or fails
+    while its replay position is checked, is skipped for
+    REPLICA_RETRY_SECONDS, and one that has not yet replayed the client's
+    last write (min_lsn) is passed over for the primary.
+    """
+    lsn = min_lsn.get()
+    connection = None
+    for replica in healthy_replicas():
+        try:
+            connection = await replica.connect()
+            # replicas replay in roughly the same order, so a lagging one sends
+            # the read to the primary rather than polling the others
+            if lsn is not None and not await replica_has_replayed(connection, lsn):
+                await connection.close()
+                connection = None
+        except exc.DBAPIError as e:
+            retry_seconds = config.get_settings().REPLICA_RETRY_SECONDS
+            logger.warning(
+                "replica %s unavailable, skipping it for %ss: %s",
+                replica.url.render_as_string(), retry_seconds, e
+            )
+            replica_down_until[id(replica)] = time.monotonic() + retry_seconds
+            if connection is not None:
+                await connection.close()
+                connection = None
+            continue
+        break
+
+    if connection is None:
+        connection = await engine.connect()
+
+    async with connection:
+        async with connection.begin():
+            # also on the primary, a GET handler must not write
+            await connection.execute(sqlalchemy.text("SET TRANSACTION READ ONLY"))
+            yield connection
+
+
+async def current_lsn() -> str | None:
+    """The primary's WAL position after a commit, or None without replicas."""
+    if not replicas:
+        return None
+    async with engine.connect() as connection:
+        return (await connection.execute(
+            sqlalchemy.text("SELECT pg_current_wal_lsn()::text")
+        )).scalar_one()
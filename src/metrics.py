@@ -0,0 +1,191 @@
+"""
+Request and query metrics in the Prometheus text exposition format.
+
+Request latency is recorded per route template and status by the middleware
+in server.py. Statement latency and row counts come from SQLAlchemy cursor
+events on every engine, keyed by a stable query name derived from the SQL
+text, so the same statement keeps its name across deploys and workers. All
+numbers are per worker process.
+"""
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+import functools
+import hashlib
+import re
+import time
+
+# request latency buckets in seconds
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# statement latency buckets in seconds, queries should mostly be fast
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5, 30)
+
+# route template of the request being served, set by the middleware
+current_route: ContextVar[str] = ContextVar("current_route", default="none")
+
+# [seconds, statements] spent in the database by a profiled request
+query_time: ContextVar[list | None] = ContextVar("query_time", default=None)
+
+
+def escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, labels: tuple[str, ...], buckets: tuple[float, ...]):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts..., sum, count]
+        self.series: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, *label_values) -> None:
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for label_values, series in sorted(self.series.items()):
+            for bound, count in zip(self.buckets, series):
+                labels = format_labels(self.labels, label_values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = format_labels(self.labels, label_values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, label_values)} {series[-2]}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, label_values)} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, description: str, labels: tuple[str, ...]):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.series: dict[tuple, float] = {}
+
+    def inc(self, amount: float, *label_values) -> None:
+        self.series[label_values] = self.series.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self.series.items()):
+            lines.append(f"{self.name}{format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+def collected(kind: str, name: str, description: str, labels: tuple[str, ...], series: dict[tuple, float]) -> list[str]:
+    """Render values kept elsewhere (pool, cache) as a gauge or counter."""
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+    for label_values, value in sorted(series.items()):
+        lines.append(f"{name}{format_labels(labels, label_values)} {value}")
+    return lines
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time spent serving a request, by route template, method and status.",
+    ("route", "method", "status"),
+    REQUEST_BUCKETS
+)
+query_duration = Histogram(
+    "db_query_duration_seconds",
+    "Time from sending a statement to the driver returning, by query name.",
+    ("query",),
+    QUERY_BUCKETS
+)
+query_rows = Counter(
+    "db_query_rows_total",
+    "Rows returned or affected per query name, as reported by the cursor.",
+    ("query",)
+)
+
+# query name -> normalized SQL, so a name on a dashboard can be looked up
+query_names: dict[str, str] = {}
+
+WHITESPACE = re.compile(r"\s+")
+KEYWORD = re.compile(r"\b(select|insert|update|delete|copy|explain)\b|[()]", re.IGNORECASE)
+TARGETS = {
+    "select": re.compile(r"select\b.*?\bfrom\s+([a-z_][a-z0-9_]*)", re.IGNORECASE),
+    "insert": re.compile(r"insert\s+into\s+([a-z_][a-z0-9_]*)", re.IGNORECASE),
+    "update": re.compile(r"update\s+([a-z_][a-z0-9_]*)", re.IGNORECASE),
+    "delete": re.compile(r"delete\s+from\s+([a-z_][a-z0-9_]*)", re.IGNORECASE),
+    "copy": re.compile(r"copy\s+([a-z_][a-z0-9_]*)", re.IGNORECASE),
+}
+
+
+def normalize(statement: str) -> str:
+    return WHITESPACE.sub(" ", statement).strip()
+
+
+@functools.lru_cache(maxsize=2048)
+def query_name(statement: str) -> str:
+    """
+    Stable name for a statement: the verb of its outermost statement (after
+    any CTEs), the first table that statement touches and a short hash of
+    the normalized SQL, e.g. update_course_1a2b3c4d.
+    """
+    sql = normalize(statement)
+    digest = hashlib.sha1(sql.encode()).hexdigest()[:8]
+
+    prefix = "statement"
+    depth = 0
+    for match in KEYWORD.finditer(sql):
+        token = match.group(0)
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0:
+            verb = token.lower()
+            prefix = verb
+            target = TARGETS.get(verb)
+            table = target.match(sql, match.start()) if target else None
+            if table:
+                prefix = f"{verb}_{table.group(1).lower()}"
+            break
+
+    name = f"{prefix}_{digest}"
+    query_names.setdefault(name, sql)
+    return name
+
+
+def instrument(engine: AsyncEngine) -> None:
+    """Time every statement the engine sends and count the rows it reports."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        context.query_start = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def record_query(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - context.query_start
+        name = context.execution_options.get("query_name") or query_name(statement)
+        query_duration.observe(duration, name)
+        totals = query_time.get()
+        if totals is not None:
+            totals[0] += duration
+            totals[1] += 1
+        # -1 for server-side cursors, whose rows are not known up front
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            query_rows.inc(cursor.rowcount, name)
+
+
+def render(extra: list[str]) -> str:
+    lines = request_duration.render() + query_duration.render() + query_rows.render() + extra
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,113 @@
+"""
+Opt-in profiling of single requests.
+
+With PROFILING_ENABLED set, a request carrying an X-Profile: 1 header or a
+?profile=1 query flag runs under cProfile. The profile is saved to
+PROFILE_DIR as a .prof file (pstats format, e.g. for snakeviz) next to a JSON
+summary with the wall time, the time spent inside database statements and the
+hottest functions. Router code and pydantic model construction show up in
+the function list; time blocked on Postgres is taken from the statement hooks,
+since a suspended coroutine is invisible to cProfile.
+
+cProfile sees the whole thread, so other requests served concurrently are in
+the profile too. Only one request is profiled at a time.
+"""
+from enum import StrEnum
+from pathlib import Path
+import cProfile
+import datetime
+import io
+import json
+import pstats
+import re
+from src import config
+from src import metrics
+
+# functions listed in the JSON summary
+SUMMARY_FUNCTIONS = 25
+
+active: cProfile.Profile | None = None
+
+# orders pstats can sort a report by, e.g. "cumulative" or "time"
+SortOrder = StrEnum("SortOrder", {key.value: key.value for key in pstats.SortKey})
+
+
+def requested(headers, query_params) -> bool:
+    if not config.get_settings().PROFILING_ENABLED:
+        return False
+    return headers.get("X-Profile") == "1" or query_params.get("profile") == "1"
+
+
+def profile_dir() -> Path:
+    path = Path(config.get_settings().PROFILE_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def start() -> bool:
+    """Start profiling this request, False if another one already is."""
+    global active
+    if active is not None:
+        return False
+    active = cProfile.Profile()
+    metrics.query_time.set([0.0, 0])
+    active.enable()
+    return True
+
+
+def stop(method: str, route: str, path: str, status: int, wall_seconds: float) -> str:
+    """Stop profiling, save the profile and its summary, and return its id."""
+    global active
+    profiler, active = active, None
+    profiler.disable()
+
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    slug = re.sub(r"[^a-z0-9]+", "-", route.lower()).strip("-") or "root"
+    profile_id = f"{stamp}-{method.lower()}-{slug}"
+    directory = profile_dir()
+    profiler.dump_stats(directory / f"{profile_id}.prof")
+
+    stats = pstats.Stats(profiler)
+    functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+    db_seconds, statements = metrics.query_time.get()
+    summary = {
+        "id": profile_id,
+        "method": method,
+        "route": route,
+        "path": path,
+        "status": status,
+        "wall_ms": round(wall_seconds * 1000, 2),
+        "db_ms": round(db_seconds * 1000, 2),
+        "db_statements": statements,
+        "outside_db_ms": round((wall_seconds - db_seconds) * 1000, 2),
+        "top_cumulative": [
+            {
+                "function": f"{file}:{line}({name})",
+                "calls": calls,
+                "own_ms": round(own * 1000, 3),
+                "cumulative_ms": round(cumulative * 1000, 3)
+            }
+            for (file, line, name), (_, calls, own, cumulative, _) in functions[:SUMMARY_FUNCTIONS]
+        ]
+    }
+    (directory / f"{profile_id}.json").write_text(json.dumps(summary, indent=2))
+    return profile_id
+
+
+def text_report(profile_id: str, sort: SortOrder = SortOrder.cumulative, limit: int = 50) -> str:
+    buffer = io.StringIO()
+    stats = pstats.Stats(str(profile_dir() / f"{profile_id}.prof"), stream=buffer)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return buffer.getvalue()
+
+
+def saved() -> list[dict]:
+    """Summaries of the saved profiles, newest first."""
+    return [
+        json.loads(path.read_text())
+        for path in sorted(profile_dir().glob("*.json"), reverse=True)
+    ]
+
+
+def is_profile_id(profile_id: str) -> bool:
+    return re.fullmatch(r"[0-9T]+-[a-z0-9-]+", profile_id) is not None
@@ -0,0 +1,292 @@
+"""
+Running aggregates maintained in the same transaction as review writes.
+
+Course, professor and department averages are derived from sum/count
+counters, so reading them never touches the review table. POST /stats/refresh
+recomputes the same counters from scratch and only acts as a consistency check.
+"""
+import sqlalchemy
+
+# number of tags returned by the most common tag lookups
+TOP_TAGS = 10
+
+
+async def apply_reviews(connection, review_ids: list[int]) -> None:
+    """Fold freshly inserted reviews into the course, professor, department and term rollups."""
+    if not review_ids:
+        return
+
+    await connection.execute(
+        sqlalchemy.text(
+            """
+            WITH new_reviews AS (
+                SELECT
+                    course_id,
+                    COUNT(*) AS review_count,
+                    SUM(overall_rating) AS rating_sum,
+                    SUM(difficulty) AS difficulty_sum,
+                    SUM(workload_rating) AS workload_sum
+                FROM review
+                WHERE id = ANY(:review_ids)
+                GROUP BY course_id
+            )
+            UPDATE course c
+            SET
+                review_count = c.review_count + n.review_count,
+                rating_sum = c.rating_sum + n.rating_sum,
+                difficulty_sum = c.difficulty_sum + n.difficulty_sum,
+                workload_sum = c.workload_sum + n.workload_sum,
+                avg_rating = ROUND(
+                    (c.rating_sum + n.rating_sum)::numeric / (c.review_count + n.review_count), 2
+                ),
+                avg_workload = ROUND(
+                    (c.workload_sum + n.workload_sum)::numeric / (c.review_count + n.review_count)
+                )
+            FROM new_reviews n
+            WHERE c.id = n.course_id
+            """
+        ),
+        {"review_ids": review_ids}
+    )
+
+    await connection.execute(
+        sqlalchemy.text(
+            """
+            WITH new_reviews AS (
+                SELECT
+                    professor_id,
+                    COUNT(*) AS review_count,
+                    SUM(overall_rating) AS rating_sum,
+                    SUM(difficulty) AS difficulty_sum,
+                    SUM(workload_rating) AS workload_sum
+                FROM review
+                WHERE id = ANY(:review_ids)
+                AND professor_id IS NOT NULL
+                GROUP BY professor_id
+            )
+            UPDATE professor p
+            SET
+                total_reviews = p.total_reviews + n.review_count,
+                rating_sum = p.rating_sum + n.rating_sum,
+                difficulty_sum = p.difficulty_sum + n.difficulty_sum,
+                workload_sum = p.workload_sum + n.workload_sum,
+                avg_rating = ROUND(
+                    (p.rating_sum + n.rating_sum)::numeric / (p.total_reviews + n.review_count), 2
+                ),
+                avg_difficulty = (p.difficulty_sum + n.difficulty_sum)::numeric / (p.total_reviews + n.review_count),
+                avg_workload = (p.workload_sum + n.workload_sum)::numeric / (p.total_reviews + n.review_count)
+            FROM new_reviews n
+            WHERE p.id = n.professor_id
+            """
+        ),
+        {"review_ids": review_ids}
+    )
+
+    await connection.execute(
+        sqlalchemy.text(
+            """
+            INSERT INTO department_stats
+                (department_id, total_reviews, rating_sum, difficulty_sum, workload_sum)
+            SELECT
+                dc.department_id,
+                COUNT(*),
+                SUM(r.overall_rating),
+                SUM(r.difficulty),
+                SUM(r.workload_rating)
+            FROM review r
+            JOIN department_courses dc ON dc.course_id = r.course_id
+            WHERE r.id = ANY(:review_ids)
+            GROUP BY dc.department_id
+            ON CONFLICT (department_id) DO UPDATE
+            SET
+                total_reviews = department_stats.total_reviews + EXCLUDED.total_reviews,
+                rating_sum = department_stats.rating_sum + EXCLUDED.rating_sum,
+                difficulty_sum = department_stats.difficulty_sum + EXCLUDED.difficulty_sum,
+                workload_sum = department_stats.workload_sum + EXCLUDED.workload_sum
+            """
+        ),
+        {"review_ids": review_ids}
+    )
+
+    await connection.execute(
+        sqlalchemy.text(
+            """
+            INSERT INTO course_term_stats
+                (course_id, term, professor_id, review_count,
+                 rating_sum, difficulty_sum, workload_sum)
+            SELECT
+                course_id,
+                term,
+                professor_id,
+                COUNT(*),
+                SUM(overall_rating),
+                SUM(difficulty),
+                SUM(workload_rating)
+            FROM review
+            WHERE id = ANY(:review_ids)
+            GROUP BY course_id, term, professor_id
+            ON CONFLICT (course_id, term, professor_id) DO UPDATE
+            SET
+                review_count = course_term_stats.review_count + EXCLUDED.review_count,
+                rating_sum = course_term_stats.rating_sum + EXCLUDED.rating_sum,
+                difficulty_sum = course_term_stats.difficulty_sum + EXCLUDED.difficulty_sum,
+                workload_sum = course_term_stats.workload_sum + EXCLUDED.workload_sum
+            """
+        ),
+        {"review_ids": review_ids}
+    )
+
+    # tag rollups, one (entity, tag) row per pair so top-N reads stay index lookups
+    await connection.execute(
+        sqlalchemy.text(
+            """
+            INSERT INTO course_tag_counts (course_id, tag_id, tag_count)
+            SELECT r.course_id, rt.tag_id, COUNT(*)
+            FROM review_tags rt
+            JOIN review r ON r.id = rt.review_id
+            WHERE rt.review_id = ANY(:review_ids)
+            GROUP BY r.course_id, rt.tag_id
+            ON CONFLICT (course_id, tag_id) DO UPDATE
+            SET tag_count = course_tag_counts.tag_count + EXCLUDED.tag_count
+            """
+        ),
+        {"review_ids": review_ids}
+    )
+
+    await connection.execute(
+        sqlalchemy.text(
+            """
+            INSERT INTO professor_tag_counts (professor_id, tag_id, tag_count)
+            SELECT r.professor_id, rt.tag_id, COUNT(*)
+            FROM review_tags rt
+            JOIN review r ON r.id = rt.review_id
+            WHERE rt.review_id = ANY(:review_ids)
+            AND r.professor_id IS NOT NULL
+            GROUP BY r.professor_id, rt.tag_id
+            ON CONFLICT (professor_id, tag_id) DO UPDATE
+            SET tag_count = professor_tag_counts.tag_count + EXCLUDED.tag_count
+            """
+        ),
+        {"review_ids": review_ids}
+    )
+
+    department_ids = (await connection.execute(
+        sqlalchemy.text(
+            """
+            INSERT INTO department_tag_counts (department_id, tag_id, tag_count)
+            SELECT dc.department_id, rt.tag_id, COUNT(*)
+            FROM review_tags rt
+            JOIN review r ON r.id = rt.review_id
+            JOIN department_courses dc ON dc.course_id = r.course_id
+            WHERE rt.review_id = ANY(:review_ids)
+            GROUP BY dc.department_id, rt.tag_id
+            ON CONFLICT (department_id, tag_id) DO UPDATE
+            SET tag_count = department_tag_counts.tag_count + EXCLUDED.tag_count
+            RETURNING department_id
+            """
+        ),
+        {"review_ids": review_ids}
+    )).scalars().all()
+
+    await refresh_top_tags(connection, list(set(department_ids)))
+
+
+async def refresh_top_tags(connection, department_ids: list[int]) -> None:
+    """Recompute the cached top tags of the given departments from their tag counts."""
+    if not department_ids:
+        return
+
+    await connection.execute(
+        sqlalchemy.text(
+            """
+            UPDATE department_stats ds
+            SET top_tags = ARRAY(
+                SELECT t.name
+                FROM department_tag_counts dtc
+                JOIN tag t ON t.id = dtc.tag_id
+                WHERE dtc.department_id = ds.department_id
+                ORDER BY dtc.tag_count DESC, t.name
+                LIMIT :top_tags
+            )
+            WHERE ds.department_id = ANY(:department_ids)
+            """
+        ),
+        {"department_ids": department_ids, "top_tags": TOP_TAGS}
+    )
+
+
+async def add_department(connection, department_id: int) -> None:
+    """Start an empty stats row for a new department."""
+    await connection.execute(
+        sqlalchemy.text(
+            """
+            INSERT INTO department_stats (department_id)
+            VALUES (:department_id)
+            ON CONFLICT (department_id) DO NOTHING
+            """
+        ),
+        {"department_id": department_id}
+    )
+
+
+async def add_course(connection, department_id: int) -> None:
+    """Count a course newly linked to a department."""
+    await connection.execute(
+        sqlalchemy.text(
+            """
+            INSERT INTO department_stats (department_id, total_courses)
+            VALUES (:department_id, 1)
+            ON CONFLICT (department_id) DO UPDATE
+            SET total_courses = department_stats.total_courses + 1
+            """
+        ),
+        {"department_id": department_id}
+    )
+
+
+async def apply_assignments(connection, course_ids: list[int]) -> None:
+    """Recount the professors of the departments offering newly attached courses."""
+    if not course_ids:
+        return
+
+    # distinct professor counts cannot be bumped blindly, recount the
+    # affected departments instead (professors_courses is small)
+    await connection.execute(
+        sqlalchemy.text(
+            """
+            INSERT INTO department_stats (department_id, total_professors)
+            SELECT dc.department_id, COUNT(DISTINCT pc.professor_id)
+            FROM department_courses dc
+            JOIN professors_courses pc ON pc.course_id = dc.course_id
+            WHERE dc.department_id IN (
+                SELECT department_id
+                FROM department_courses
+                WHERE course_id = ANY(:course_ids)
+            )
+            GROUP BY dc.department_id
+            ON CONFLICT (department_id) DO UPDATE
+            SET total_professors = EXCLUDED.total_professors
+            """
+        ),
+        {"course_ids": course_ids}
+    )
+
+
+async def top_tags(connection, entity: str, entity_id: int) -> list[str]:
+    """Most common tags of a course, professor or department, read from its tag rollup."""
+    if entity not in ("course", "professor", "department"):
+        raise ValueError(f"Unknown tag rollup {entity}")
+
+    return (await connection.execute(
+        sqlalchemy.text(
+            f"""
+            SELECT t.name
+            FROM {entity}_tag_counts tc
+            JOIN tag t ON t.id = tc.tag_id
+            WHERE tc.{entity}_id = :entity_id
+            ORDER BY tc.tag_count DESC, t.name
+            LIMIT :top_tags
+            """
+        ),
+        {"entity_id": entity_id, "top_tags": TOP_TAGS}
+    )).scalars().all()
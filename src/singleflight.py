@@ -0,0 +1,64 @@
+"""
+Request coalescing for expensive GET endpoints.
+
+Concurrent calls with the same route and parameters share one execution:
+the first caller starts it, everyone arriving before it finishes awaits the
+same result (or exception). Calls pinned to different min_lsn positions
+never share one. Nothing is kept afterwards, that is the response cache's
+job, so this only collapses bursts.
+"""
+from collections import Counter
+import asyncio
+import functools
+from src import config
+from src import database as db
+from src.cache import request_key
+
+in_flight: dict[str, asyncio.Task] = {}
+executions: Counter[str] = Counter()
+coalesced_requests: Counter[str] = Counter()
+
+
+def coalesced(route: str):
+    """Share one in-flight execution of the endpoint among identical concurrent calls."""
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(**params):
+            if route not in config.get_settings().COALESCE_ROUTES:
+                return await endpoint(**params)
+
+            key = request_key(route, params)
+            # a read pinned to a WAL position (the client's last write, or the
+            # cache's after an invalidation) is only shared with the same pin
+            lsn = db.min_lsn.get()
+            if lsn is not None:
+                key += f"@{lsn}"
+            task = in_flight.get(key)
+            if task is None:
+                executions[route] += 1
+                task = asyncio.ensure_future(endpoint(**params))
+                in_flight[key] = task
+                task.add_done_callback(lambda _: in_flight.pop(key, None))
+            else:
+                coalesced_requests[route] += 1
+
+            # a caller that disconnects must not cancel the others' execution
+            return await asyncio.shield(task)
+
+        return wrapper
+
+    return decorator
+
+
+def stats() -> dict:
+    routes = sorted(set(executions) | set(coalesced_requests))
+    return {
+        "in_flight": len(in_flight),
+        "routes": {
+            route: {
+                "executions": executions[route],
+                "coalesced": coalesced_requests[route]
+            }
+            for route in routes
+        }
+    }
@@ -0,0 +1,152 @@
+"""
+Slow-query log.
+
+Any statement slower than SLOW_QUERY_MS is recorded with its SQL, parameters,
+duration, query name and the route that issued it. A sampled fraction of slow
+read-only statements is re-run under EXPLAIN (ANALYZE, BUFFERS) in the
+background and the plan attached to the entry. Entries go to a size-rotated
+JSON lines file and the most recent ones are kept for GET /admin/slow-queries.
+"""
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+import asyncio
+import datetime
+import json
+import logging
+import random
+import re
+import time
+from src import config
+from src import metrics
+
+# longest parameter value kept in an entry, bulk loads pass huge arrays
+MAX_PARAM_CHARS = 200
+
+settings = config.get_settings()
+recent: deque[dict] = deque(maxlen=settings.SLOW_QUERY_KEEP)
+
+logger = logging.getLogger("slow_queries")
+logger.propagate = False
+logger.setLevel(logging.INFO)
+# the log file is opened on the first entry, importing the app writes nothing
+log_opened = False
+
+# statements that write, even inside a CTE named after its final SELECT,
+# have side effects outside the transaction, or take locks
+NOT_REPEATABLE = re.compile(
+    r"\b(insert|update|delete|merge|nextval|setval|pg_notify|for update|for share)\b",
+    re.IGNORECASE
+)
+
+# one EXPLAIN ANALYZE at a time, they run the whole query again
+explaining = False
+explain_tasks: set[asyncio.Task] = set()
+
+
+def shorten(value):
+    text = repr(value)
+    if len(text) > MAX_PARAM_CHARS:
+        return text[:MAX_PARAM_CHARS] + f"... ({len(text)} chars)"
+    return value if isinstance(value, (int, float, str, bool, type(None))) else text
+
+
+def open_log() -> None:
+    """Attach SLOW_QUERY_LOG to the logger, or stderr when it cannot be written."""
+    global log_opened
+    log_opened = True
+    if not settings.SLOW_QUERY_LOG:
+        return
+    try:
+        Path(settings.SLOW_QUERY_LOG).parent.mkdir(parents=True, exist_ok=True)
+        handler = RotatingFileHandler(
+            settings.SLOW_QUERY_LOG,
+            maxBytes=settings.SLOW_QUERY_LOG_BYTES,
+            backupCount=settings.SLOW_QUERY_LOG_BACKUPS
+        )
+    except OSError as e:
+        # e.g. a read-only filesystem on serverless deploys
+        print(f"Cannot open slow query log {settings.SLOW_QUERY_LOG}, logging to stderr: {e}")
+        handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+
+
+def write(entry: dict) -> None:
+    recent.append(entry)
+    if not log_opened:
+        open_log()
+    if logger.handlers:
+        logger.info(json.dumps(entry, default=str))
+
+
+async def explain(engine: AsyncEngine, entry: dict, statement: str, parameters) -> None:
+    """Re-run a slow read under EXPLAIN (ANALYZE, BUFFERS) and log it with its plan."""
+    global explaining
+    try:
+        async with engine.connect() as connection:
+            await connection.exec_driver_sql(
+                f"SET LOCAL statement_timeout = {int(settings.SLOW_QUERY_EXPLAIN_TIMEOUT_MS)}"
+            )
+            plan = (await connection.exec_driver_sql(
+                "EXPLAIN (ANALYZE, BUFFERS) " + statement,
+                parameters
+            )).scalars().all()
+            # ANALYZE really ran the query, leave no trace of it
+            await connection.rollback()
+        entry["plan"] = "\n".join(plan)
+    except Exception as e:
+        entry["plan_error"] = str(e)
+    finally:
+        explaining = False
+    write(entry)
+
+
+def instrument(engine: AsyncEngine) -> None:
+    """Log statements on this engine that run longer than SLOW_QUERY_MS."""
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def record_slow_query(conn, cursor, statement, parameters, context, executemany):
+        global explaining
+        # query_start is stamped by the metrics hooks, registered first
+        start = getattr(context, "query_start", None)
+        if start is None:
+            return
+        duration_ms = (time.perf_counter() - start) * 1000
+        if duration_ms < settings.SLOW_QUERY_MS:
+            return
+
+        name = context.execution_options.get("query_name") or metrics.query_name(statement)
+        if name.startswith("explain"):
+            return
+
+        entry = {
+            "at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "query": name,
+            "route": metrics.current_route.get(),
+            "engine": engine.url.render_as_string(),
+            "duration_ms": round(duration_ms, 1),
+            "rows": cursor.rowcount,
+            "sql": metrics.normalize(statement),
+            "params": (
+                {key: shorten(value) for key, value in parameters.items()}
+                if isinstance(parameters, dict) else shorten(parameters)
+            )
+        }
+
+        # only plain reads are safe to run a second time
+        if (
+            name.startswith("select")
+            and not executemany
+            and not NOT_REPEATABLE.search(statement)
+            and not explaining
+            and random.random() < settings.SLOW_QUERY_EXPLAIN_SAMPLE
+        ):
+            explaining = True
+            task = asyncio.get_running_loop().create_task(explain(engine, entry, statement, parameters))
+            explain_tasks.add(task)
+            task.add_done_callback(explain_tasks.discard)
+        else:
+            write(entry)
@@ -0,0 +1,92 @@
+"""
+Response cache together with request coalescing, no database needed.
+"""
+import asyncio
+import pytest
+from src import config
+from src import database as db
+from src import singleflight
+from src.cache import cache, cached
+from src.singleflight import coalesced
+
+ROUTE = "test_route"
+TAG = "test:1"
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    monkeypatch.setattr(config.get_settings(), "CACHE_ENABLED", True)
+    monkeypatch.setattr(config.get_settings(), "COALESCE_ROUTES", {ROUTE})
+    cache.clear()
+    cache.fill_lsn = None
+    cache.fill_lsn_until = 0.0
+    yield
+    cache.clear()
+    cache.fill_lsn = None
+    cache.fill_lsn_until = 0.0
+    singleflight.executions.pop(ROUTE, None)
+    singleflight.coalesced_requests.pop(ROUTE, None)
+
+
+def endpoint_counting(pins: list):
+    @cached(ROUTE, ttl=60, tags=lambda _, item_id: [TAG])
+    @coalesced(ROUTE)
+    async def endpoint(item_id: int):
+        pins.append(db.min_lsn.get())
+        # long enough for every concurrent caller to arrive
+        await asyncio.sleep(0.05)
+        return {"id": item_id}
+
+    return endpoint
+
+
+async def burst(endpoint, calls: int) -> list:
+    return await asyncio.gather(*(endpoint(item_id=1) for _ in range(calls)))
+
+
+def test_misses_share_one_execution():
+    pins = []
+    responses = asyncio.run(burst(endpoint_counting(pins), 20))
+
+    assert pins == [None]
+    assert {response.body for response in responses} == {b'{"id":1}'}
+    assert singleflight.executions[ROUTE] == 1
+    assert singleflight.coalesced_requests[ROUTE] == 19
+
+
+def test_misses_after_an_invalidation_share_one_pinned_execution():
+    # what a write does when replicas are configured
+    cache.invalidate([TAG], "0/1000")
+    pins = []
+    responses = asyncio.run(burst(endpoint_counting(pins), 20))
+
+    assert pins == ["0/1000"]
+    assert {response.body for response in responses} == {b'{"id":1}'}
+    assert singleflight.executions[ROUTE] == 1
+    assert singleflight.coalesced_requests[ROUTE] == 19
+
+    # the pinned fill was cached
+    response = asyncio.run(endpoint_counting(pins)(item_id=1))
+    assert response.headers["X-Cache"] == "HIT"
+
+
+def test_calls_pinned_to_different_positions_do_not_share():
+    pins = []
+
+    @coalesced(ROUTE)
+    async def endpoint(item_id: int):
+        pins.append(db.min_lsn.get())
+        await asyncio.sleep(0.05)
+        return {"id": item_id}
+
+    async def pinned(lsn: str):
+        db.min_lsn.set(lsn)
+        return await endpoint(item_id=1)
+
+    async def run():
+        return await asyncio.gather(pinned("0/1000"), pinned("0/1000"), pinned("0/2000"))
+
+    asyncio.run(run())
+    assert sorted(pins) == ["0/1000", "0/2000"]
+    assert singleflight.executions[ROUTE] == 2
+    assert singleflight.coalesced_requests[ROUTE] == 1
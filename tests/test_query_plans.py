@@ -0,0 +1,272 @@
+"""
+Plan checks for the SQL the routers send, against a seeded database.
+
+Every route in scripts/load_test.py is called in-process through the ASGI app,
+and each distinct statement it sends is captured with its real parameters.
+Every statement then gets one test per check:
+
+    explain   EXPLAIN (FORMAT JSON) succeeds. Reads run with ANALYZE inside a
+              transaction that is rolled back
+    seq-scan  no sequential scan on review or review_tags, outside the batch
+              routes in FULL_SCAN_ROUTES
+    sort      no sort that spills to disk: an external sort under ANALYZE,
+              or an estimated input larger than work_mem otherwise
+    cost      estimated total cost within the route's budget
+
+Planner choices on a small table say little, so the module is skipped unless
+POSTGRES_URI reaches a database with at least MIN_REVIEWS reviews
+(scripts/generate_fake_data.py). Write routes are only called with
+PLAN_CHECK_WRITES=1, and they change the data.
+
+    uv run pytest tests/test_query_plans.py
+    PLAN_CHECK_WRITES=1 PLAN_CHECK_MAX_COST=50000 uv run pytest tests/test_query_plans.py
+"""
+from dataclasses import dataclass
+from pathlib import Path
+import ast
+import asyncio
+import json
+import os
+import random
+import re
+import warnings
+import httpx
+import pytest
+import sqlalchemy
+from sqlalchemy import event
+from scripts import load_test
+from src import config
+from src import database as db
+from src import metrics
+from src.api.server import app
+from src.cache import cache
+
+root_dir = Path(__file__).parent.parent
+
+# tables that must be reached through an index on the request path
+INDEXED_TABLES = {"review", "review_tags"}
+
+# batch routes that are expected to read whole tables
+FULL_SCAN_ROUTES = {"POST /stats/refresh", "GET /reviews/export"}
+
+# estimated total cost allowed per statement, by route
+DEFAULT_COST_BUDGET = 20_000
+COST_BUDGETS = {
+    "POST /stats/refresh": None,
+    "GET /reviews/export": None,
+}
+
+# below this many reviews the planner prefers sequential scans anyway
+MIN_REVIEWS = 100_000
+
+# requests per route, so optional filters and sort orders show up
+SAMPLES = 3
+SEED = 365
+
+WRITES = config.env_flag("PLAN_CHECK_WRITES", "false")
+MAX_COST = float(os.getenv("PLAN_CHECK_MAX_COST", str(DEFAULT_COST_BUDGET)))
+
+EXPLAINABLE = re.compile(r"^\s*(select|with|insert|update|delete)\b", re.IGNORECASE)
+READ_ONLY = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+SIDE_EFFECTS = re.compile(r"\b(insert|update|delete|nextval|setval|pg_notify|for update|for share)\b", re.IGNORECASE)
+
+SOURCES = [*sorted((root_dir / "src" / "api" / "routers").glob("*.py")), root_dir / "src" / "rollups.py"]
+
+
+@dataclass
+class Statement:
+    route: str
+    sql: str
+    parameters: dict | tuple | None
+
+    def __str__(self) -> str:
+        return f"{self.route} {metrics.query_name(self.sql)}"
+
+
+engine = sqlalchemy.create_engine(config.get_settings().POSTGRES_URI)
+
+
+def seeded_reviews() -> int | None:
+    try:
+        with engine.connect() as connection:
+            return connection.execute(sqlalchemy.text("SELECT count(*) FROM review")).scalar_one()
+    except sqlalchemy.exc.DBAPIError:
+        return None
+
+
+reviews = seeded_reviews()
+if reviews is None or reviews < MIN_REVIEWS:
+    pytest.skip(
+        f"needs a database seeded with at least {MIN_REVIEWS} reviews, found {reviews}",
+        allow_module_level=True
+    )
+
+
+def capture_statements() -> list[Statement]:
+    """Call every route and keep the first instance of each statement it sends."""
+    captured: dict[tuple[str, str], Statement] = {}
+    current_route = None
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if current_route is None or not EXPLAINABLE.match(statement):
+            return
+        if executemany:
+            parameters = parameters[0] if parameters else None
+        key = (current_route, metrics.normalize(statement))
+        captured.setdefault(key, Statement(current_route, statement, parameters))
+
+    async def exercise(routes: list[str]) -> None:
+        nonlocal current_route
+        transport = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://plans", timeout=None) as client:
+                fixtures = await load_test.discover(client)
+                rng = random.Random(SEED)
+                for name in routes:
+                    for _ in range(SAMPLES):
+                        method, url, kwargs = load_test.ROUTES_BY_NAME[name].build(rng, fixtures)
+                        current_route = name
+                        # a cache hit sends no SQL
+                        cache.clear()
+                        await client.request(method, url, **kwargs)
+                        current_route = None
+        finally:
+            # the pools belong to this event loop
+            await db.engine.dispose()
+            for replica in db.replicas:
+                await replica.dispose()
+
+    routes = list(load_test.READ_WEIGHTS)
+    if WRITES:
+        routes += list(load_test.WRITE_WEIGHTS)
+
+    engines = [db.engine, *db.replicas]
+    for app_engine in engines:
+        event.listen(app_engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        asyncio.run(exercise(routes))
+    finally:
+        for app_engine in engines:
+            event.remove(app_engine.sync_engine, "before_cursor_execute", capture)
+    return list(captured.values())
+
+
+STATEMENTS = capture_statements()
+
+with engine.connect() as connection:
+    WORK_MEM_BYTES = connection.execute(sqlalchemy.text(
+        "SELECT setting::bigint * 1024 FROM pg_settings WHERE name = 'work_mem'"
+    )).scalar_one()
+
+plans: dict[int, tuple[dict, bool]] = {}
+
+
+def explain(statement: Statement) -> tuple[dict, bool]:
+    """The statement's root plan node, and whether it was run under ANALYZE."""
+    if id(statement) in plans:
+        return plans[id(statement)]
+
+    # reads are run for real so sorts report where they went, never writes
+    analyzed = bool(READ_ONLY.match(statement.sql)) and not SIDE_EFFECTS.search(statement.sql)
+    options = "ANALYZE, FORMAT JSON" if analyzed else "FORMAT JSON"
+    sql = statement.sql
+    if not statement.parameters:
+        # the driver only unescapes %% when it has parameters to bind
+        sql = sql.replace("%%", "%")
+    with engine.connect() as connection:
+        try:
+            result = connection.exec_driver_sql(
+                f"EXPLAIN ({options}) " + sql,
+                statement.parameters or None
+            ).scalar_one()
+        finally:
+            connection.rollback()
+    document = result if isinstance(result, list) else json.loads(result)
+    plans[id(statement)] = document[0]["Plan"], analyzed
+    return plans[id(statement)]
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from plan_nodes(child)
+
+
+each_statement = pytest.mark.parametrize("statement", STATEMENTS, ids=str)
+
+
+@each_statement
+def test_explain(statement: Statement):
+    explain(statement)
+
+
+@each_statement
+def test_no_sequential_scan(statement: Statement):
+    if statement.route in FULL_SCAN_ROUTES:
+        pytest.skip("batch route, reads whole tables")
+    plan, _ = explain(statement)
+    scanned = [
+        node["Relation Name"] for node in plan_nodes(plan)
+        if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in INDEXED_TABLES
+    ]
+    assert not scanned, f"sequential scan on {', '.join(scanned)}"
+
+
+@each_statement
+def test_no_disk_sort(statement: Statement):
+    plan, analyzed = explain(statement)
+    spills = []
+    for node in plan_nodes(plan):
+        if node["Node Type"] not in ("Sort", "Incremental Sort"):
+            continue
+        if analyzed:
+            if node.get("Sort Space Type") == "Disk" or "external" in node.get("Sort Method", ""):
+                spills.append(f"{node.get('Sort Method')} using {node.get('Sort Space Used')} kB on disk")
+        else:
+            estimated = node["Plan Rows"] * node["Plan Width"]
+            if estimated > WORK_MEM_BYTES:
+                spills.append(f"about {estimated // 1024} kB to sort, work_mem is {WORK_MEM_BYTES // 1024} kB")
+    assert not spills, "; ".join(spills)
+
+
+@each_statement
+def test_cost_within_budget(statement: Statement):
+    budget = COST_BUDGETS.get(statement.route, MAX_COST)
+    if budget is None:
+        pytest.skip("no cost budget for this route")
+    plan, _ = explain(statement)
+    assert plan["Total Cost"] <= budget, f"estimated cost {plan['Total Cost']:.0f}, budget {budget:.0f}"
+
+
+def static_statements() -> list[tuple[str, int, str]]:
+    """(file, line, SQL) of every constant sqlalchemy.text() in the router code."""
+    found = []
+    for path in SOURCES:
+        for node in ast.walk(ast.parse(path.read_text())):
+            if (
+                isinstance(node, ast.Call)
+                and isinstance(node.func, ast.Attribute)
+                and node.func.attr == "text"
+                and node.args
+                and isinstance(node.args[0], ast.Constant)
+                and isinstance(node.args[0].value, str)
+            ):
+                found.append((str(path.relative_to(root_dir)), node.lineno, node.args[0].value))
+    return found
+
+
+def compiled(sql: str) -> str:
+    """A text() literal as psycopg receives it, bind parameters in pyformat."""
+    sql = sql.replace("%", "%%")
+    return metrics.normalize(re.sub(r"(?<![:\w]):(\w+)", r"%(\1)s", sql))
+
+
+def test_router_statements_are_exercised():
+    """Warns about router SQL no request sent, so new SQL without a route here is noticed."""
+    sent = {metrics.normalize(statement.sql) for statement in STATEMENTS}
+    unexercised = [
+        f"{path}:{line}" for path, line, sql in static_statements()
+        if compiled(sql) not in sent and EXPLAINABLE.match(sql)
+    ]
+    if unexercised:
+        warnings.warn(f"{len(unexercised)} router statements were not sent by any request: {', '.join(unexercised)}")